@@ -1,2 +1,4 @@
-from core.rest_client import RestClient
+from core.response import CachedResponse
+from core.rest_client import RestClient, RequestLog, BatchResult, request_log
 from core.result_base import ResultBase,ContentType
+from core.latency import LatencyRecorder, latency_recorder
@@ -0,0 +1,181 @@
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import httpx
+
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+# 回放时需要去除的响应头，录制的内容已经是解码后的数据
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# 区分请求身份的请求头，同一接口不同凭据的响应不同（如 200 和 401）
+_IDENTITY_HEADERS = ("authorization", "proxy-authorization")
+
+# 当前请求所属测试的 nodeid，由 conftest 在每个测试 setup 时设置，测试之外的请求为空字符串
+current_test: ContextVar[str] = ContextVar("cassette_current_test", default="")
+
+
+class CassetteMissError(httpx.TransportError):
+    """回放模式下请求未在磁带中找到"""
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    录制/回放 httpx 传输层
+
+    record 模式下转发请求到真实传输层，并把请求/响应对写入磁带文件；
+    replay 模式下从内存中的磁带直接返回响应，不产生任何网络请求。
+    磁带按测试 nodeid 分组，以 method、path、query、身份请求头和请求体哈希作为索引，
+    每个测试中同一索引的多次请求按录制顺序回放，与测试在哪个 xdist worker、以什么顺序执行无关。
+    """
+
+    MODES = ("record", "replay")
+    META_FILE = "meta.json"
+
+    def __init__(
+            self,
+            cassette_dir: str | os.PathLike,
+            mode: str,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+            *,
+            name: str = "cassette"
+    ):
+        """
+        :param cassette_dir: 磁带文件目录
+        :param mode: record 或 replay
+        :param transport: record 模式下实际发送请求的传输层
+        :param name: 本进程录制时写入的磁带文件名，xdist 下按 worker 区分
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid cassette mode. Allowed: {self.MODES}")
+        if mode == "record" and transport is None:
+            raise ValueError("record mode requires a real transport")
+
+        self.mode = mode
+        self._dir = Path(cassette_dir)
+        self._file = self._dir / f"{name}.json.gz"
+        self._transport = transport
+        # nodeid -> 索引 -> 按录制顺序的响应
+        self._entries: dict[str, dict[str, list[dict]]] = {}
+        self._cursors: dict[tuple[str, str], int] = {}
+
+        if mode == "replay":
+            self._load()
+
+    @classmethod
+    def clear(cls, cassette_dir: str | os.PathLike) -> None:
+        """删除目录下已有的磁带和元数据，录制开始前调用，避免旧的录制混入回放"""
+        cassette_dir = Path(cassette_dir)
+        for file in cassette_dir.glob("*.json.gz"):
+            file.unlink()
+        (cassette_dir / cls.META_FILE).unlink(missing_ok=True)
+
+    @classmethod
+    def write_meta(cls, cassette_dir: str | os.PathLike, meta: dict[str, Any]) -> None:
+        """写入录制时的元数据（如测试数据的时间戳），回放时据此还原请求"""
+        cassette_dir = Path(cassette_dir)
+        cassette_dir.mkdir(parents=True, exist_ok=True)
+        (cassette_dir / cls.META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+
+    @classmethod
+    def read_meta(cls, cassette_dir: str | os.PathLike) -> dict[str, Any]:
+        meta_file = Path(cassette_dir) / cls.META_FILE
+        if not meta_file.exists():
+            return {}
+        return json.loads(meta_file.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def request_key(request: httpx.Request) -> str:
+        """计算请求在磁带中的索引"""
+        query = urlencode(sorted(request.url.params.multi_items()))
+        identity = [f"{name}:{value}" for name in _IDENTITY_HEADERS for value in request.headers.get_list(name)]
+        identity_hash = hashlib.sha256("\n".join(identity).encode()).hexdigest()[:16] if identity else "-"
+        body_hash = hashlib.sha256(request.content).hexdigest()[:16]
+        return f"{request.method} {request.url.path}?{query} {identity_hash} {body_hash}"
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key = self.request_key(request)
+
+        if self.mode == "replay":
+            return self._replay(current_test.get(), key, request)
+
+        response = await self._transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+
+        entry = {
+            "status": response.status_code,
+            "headers": [
+                [k, v] for k, v in response.headers.multi_items() if k.lower() not in _DROP_HEADERS
+            ],
+            "body": base64.b64encode(content).decode(),
+        }
+        self._entries.setdefault(current_test.get(), {}).setdefault(key, []).append(entry)
+        return self._build_response(entry, request)
+
+    async def aclose(self) -> None:
+        if self.mode == "record":
+            self.save()
+            await self._transport.aclose()
+
+    def save(self) -> None:
+        """原子地写入本进程录制的磁带"""
+        self._dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self._file.with_suffix(".tmp")
+        with gzip.open(tmp_file, "wt", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_file, self._file)
+        count = sum(len(entries) for test in self._entries.values() for entries in test.values())
+        logger.info(f"录制 {count} 条请求到磁带 {self._file}")
+
+    def _load(self) -> None:
+        """加载目录下所有磁带文件，xdist 各 worker 录制的磁带合并回放"""
+        for file in sorted(self._dir.glob("*.json.gz")):
+            with gzip.open(file, "rt", encoding="utf-8") as f:
+                for nodeid, keys in json.load(f).items():
+                    test = self._entries.setdefault(nodeid, {})
+                    for key, entries in keys.items():
+                        test.setdefault(key, []).extend(entries)
+        logger.info(f"从 {self._dir} 加载 {len(self._entries)} 个测试的磁带")
+
+    def _replay(self, nodeid: str, key: str, request: httpx.Request) -> httpx.Response:
+        entries = self._entries.get(nodeid, {}).get(key)
+        if not entries:
+            # session 作用域 fixture 中的请求录制在首个用到它的测试下，xdist 下该测试不一定相同
+            entries = self._find_other(key)
+            if not entries:
+                raise CassetteMissError(f"Request not found in cassette: {nodeid} {key}", request=request)
+            return self._build_response(entries[0], request)
+
+        # 按测试内的录制顺序回放，超出录制次数后重复最后一次响应
+        cursor = self._cursors.get((nodeid, key), 0)
+        self._cursors[(nodeid, key)] = cursor + 1
+        return self._build_response(entries[min(cursor, len(entries) - 1)], request)
+
+    def _find_other(self, key: str) -> Optional[list[dict]]:
+        """其他测试（按 nodeid 排序的第一个）录制的同一请求"""
+        for nodeid in sorted(self._entries):
+            entries = self._entries[nodeid].get(key)
+            if entries:
+                return entries
+        return None
+
+    @staticmethod
+    def _build_response(entry: dict, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            entry["status"],
+            headers=entry["headers"],
+            content=base64.b64decode(entry["body"]),
+            request=request,
+        )
@@ -0,0 +1,108 @@
+import math
+import time
+
+from collections import defaultdict
+from typing import Any
+
+# httpcore trace 事件名（去掉 http11/http2/connection 前缀后）到耗时阶段的映射
+# httpcore 不单独暴露 DNS 解析，DNS 耗时包含在 connect 阶段中
+_TRACE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "server",
+    "receive_response_body": "transfer",
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """最近秩法计算百分位数，sorted_values 需已升序排列"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    """计算样本的数量、均值、最大值和 p50/p95/p99（毫秒）"""
+    ordered = sorted(values)
+    summary = {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(percentile(ordered, p) * 1000, 3)
+    return summary
+
+
+class RequestTimer:
+    """
+    单次请求计时器，作为 httpx 的 trace 扩展收集各阶段耗时
+    """
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self._started: dict[str, float] = {}
+        self._start = time.perf_counter()
+        self.total: float = 0.0
+
+    async def trace(self, event_name: str, info: dict[str, Any]) -> None:
+        prefix_and_name, _, status = event_name.rpartition(".")
+        phase = _TRACE_PHASES.get(prefix_and_name.partition(".")[2])
+        if phase is None:
+            return
+        if status == "started":
+            self._started[prefix_and_name] = time.perf_counter()
+        elif prefix_and_name in self._started:
+            elapsed = time.perf_counter() - self._started.pop(prefix_and_name)
+            self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+    def stop(self) -> None:
+        self.total = time.perf_counter() - self._start
+
+
+class LatencyRecorder:
+    """
+    按 "METHOD 接口模板" 聚合请求耗时（秒），用于生成 p50/p95/p99 报告
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.samples: dict[str, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+
+    def add(self, method: str, endpoint: str, timer: RequestTimer) -> None:
+        series = self.samples[f"{method} {endpoint}"]
+        series["total"].append(timer.total)
+        for phase, elapsed in timer.phases.items():
+            series[phase].append(elapsed)
+
+    def merge(self, samples: dict[str, dict[str, list[float]]]) -> None:
+        """合并其他进程（xdist worker）采集的样本"""
+        for key, series in samples.items():
+            for phase, values in series.items():
+                self.samples[key][phase].extend(values)
+
+    def export(self) -> dict[str, dict[str, list[float]]]:
+        """导出可跨进程传输的原始样本"""
+        return {key: dict(series) for key, series in self.samples.items()}
+
+    def report(self) -> dict[str, Any]:
+        """生成按接口聚合的耗时报告（毫秒）"""
+        report = {}
+        for key in sorted(self.samples):
+            series = self.samples[key]
+            report[key] = {
+                **summarize(series["total"]),
+                "phases": {
+                    phase: summarize(values)
+                    for phase, values in series.items() if phase != "total"
+                },
+            }
+        return report
+
+
+latency_recorder = LatencyRecorder()
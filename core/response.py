@@ -0,0 +1,55 @@
+import json
+import httpx
+
+from typing import Any
+
+_UNSET = object()
+
+
+class CachedResponse:
+    """
+    httpx.Response 的包装类，响应体只解码一次
+
+    json() 的结果（或解码异常）在第一次调用后缓存，日志、ResultBase 和关键字层共享同一个解析对象，
+    调用方不应修改返回的对象。其余属性和方法直接代理到原始响应。
+    """
+
+    __slots__ = ("raw", "_json", "_json_error")
+
+    def __init__(self, response: httpx.Response):
+        self.raw = response
+        self._json: Any = _UNSET
+        self._json_error: Exception | None = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.raw, name)
+
+    def __repr__(self):
+        return repr(self.raw)
+
+    @property
+    def content(self) -> bytes:
+        return self.raw.content
+
+    @property
+    def text(self) -> str:
+        return self.raw.text
+
+    def json(self) -> Any:
+        """解码响应体，结果和异常都只计算一次"""
+        if self._json is _UNSET and self._json_error is None:
+            try:
+                self._json = json.loads(self.raw.content)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                self._json_error = e
+        if self._json_error is not None:
+            raise self._json_error
+        return self._json
+
+    @property
+    def is_json(self) -> bool:
+        try:
+            self.json()
+            return True
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return False
@@ -1,21 +1,97 @@
+import asyncio
 import logging
 import allure
 import httpx
 import pytest
 
 import utils
-from typing import Optional, Any
+from core.latency import RequestTimer, latency_recorder
+from core.response import CachedResponse
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import Optional, Any, Iterable
 import json as complexjson
 
 logger = logging.getLogger(__name__)
 
 
+class RequestLog:
+    """
+    测试级请求/响应缓冲区
+
+    延迟模式下只保存原始请求参数和响应对象，测试失败或被采样命中时才序列化、脱敏并附加到 Allure
+    """
+
+    def __init__(self, maxlen: int = 50):
+        """
+        :param maxlen: 每个测试最多保留的请求条数，超出后丢弃最早的记录
+        """
+        self._entries: deque[list] = deque(maxlen=maxlen)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, client: 'RestClient', method: str, path: str, kwargs: dict) -> list:
+        """记录一次请求，返回的条目在收到响应后回填"""
+        entry = [client, method, path, kwargs, None]
+        self._entries.append(entry)
+        return entry
+
+    def flush(self) -> None:
+        """将缓冲的请求/响应写入日志和 Allure 后清空"""
+        for client, method, path, kwargs, response in self._entries:
+            client._log_request_details(method, path, **kwargs)
+            if response is not None:
+                client._log_response_details(response)
+        self.clear()
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def extend(self, other: 'RequestLog') -> None:
+        """追加另一个缓冲区中的记录"""
+        self._entries.extend(other._entries)
+
+    def activate(self) -> Token:
+        """在当前上下文（如并发执行测试的 asyncio 任务）中使用该缓冲区记录请求"""
+        return _active_request_log.set(self)
+
+    @staticmethod
+    def active() -> 'RequestLog':
+        """当前上下文使用的缓冲区，默认为模块级的 request_log"""
+        active = _active_request_log.get()
+        return request_log if active is None else active
+
+
+_active_request_log: ContextVar[Optional[RequestLog]] = ContextVar("active_request_log", default=None)
+
+request_log = RequestLog()
+
+
+class BatchResult:
+    """批量请求中单个请求的结果，response 与 error 二者必有其一"""
+
+    def __init__(self, response: Optional[CachedResponse] = None, error: Optional[BaseException] = None):
+        self.response = response
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f"BatchResult(response={self.response!r}, error={self.error!r})"
+
+
 class RestClient:
     """异步HTTP客户端，支持敏感信息过滤和Allure集成"""
 
     _SENSITIVE_HEADERS = {'authorization', 'token'}
     _HTTP_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH"]
 
+    # 延迟日志模式：请求/响应先缓存在 request_log 中，由 conftest 在测试失败时统一输出
+    deferred_log: bool = True
+
     def __init__(
             self,
             http_client: Optional[httpx.AsyncClient] = None,
@@ -51,13 +127,14 @@ class RestClient:
             data: Optional[Any] = None,
             json: Optional[Any] = None,
             **kwargs
-    ) -> httpx.Response:
+    ) -> CachedResponse:
         """
         统一请求入口
         :param method: HTTP方法 (GET/POST/PUT/DELETE/PATCH)
         :param path: API端点路径
         :param data: 请求体数据 (表单类型)
         :param json: 请求体数据 (JSON类型)
+        :param kwargs: 其他请求参数，endpoint 为耗时统计使用的接口模板，默认使用 path
         :return: 响应对象
         """
         method = method.upper()
@@ -67,26 +144,59 @@ class RestClient:
 
         return await self._execute_request(method, path, data=data, json=json, **kwargs)
 
-    async def get(self, path: str, **kwargs) -> httpx.Response:
+    async def get(self, path: str, **kwargs) -> CachedResponse:
         """发送GET请求"""
         return await self.request("GET", path, **kwargs)
 
-    async def post(self, path: str, **kwargs) -> httpx.Response:
+    async def post(self, path: str, **kwargs) -> CachedResponse:
         """发送POST请求"""
         return await self.request("POST", path, **kwargs)
 
-    async def put(self, path: str, **kwargs) -> httpx.Response:
+    async def put(self, path: str, **kwargs) -> CachedResponse:
         """发送PUT请求"""
         return await self.request("PUT", path, **kwargs)
 
-    async def delete(self, path: str, **kwargs) -> httpx.Response:
+    async def delete(self, path: str, **kwargs) -> CachedResponse:
         """发送DELETE请求"""
         return await self.request("DELETE", path, **kwargs)
 
-    async def patch(self, path: str, **kwargs) -> httpx.Response:
+    async def patch(self, path: str, **kwargs) -> CachedResponse:
         """发送PATCH请求"""
         return await self.request("PATCH", path, **kwargs)
 
+    async def batch(
+            self,
+            requests: Iterable[dict[str, Any]],
+            *,
+            concurrency: int = 10
+    ) -> list[BatchResult]:
+        """
+        并发发送多个请求
+        :param requests: 请求描述列表，每项包含 method、path 及 request 支持的其他参数
+        :param concurrency: 同时进行中的最大请求数
+        :return: 与输入顺序一致的结果列表，单个请求失败时记录在对应结果的 error 中
+        """
+        if concurrency <= 0:
+            raise ValueError(f"concurrency must be a positive integer, got {concurrency}")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(spec: dict[str, Any]) -> BatchResult:
+            kwargs = dict(spec)
+            async with semaphore:
+                try:
+                    method = kwargs.pop("method").upper()
+                    path = kwargs.pop("path")
+                    if method not in self._HTTP_METHODS:
+                        raise ValueError(
+                            f"Invalid HTTP method. Allowed: {self._HTTP_METHODS}")
+                    response = await self._perform_request(method, path, **kwargs)
+                except Exception as e:
+                    logger.error("Batch request failed: %s", e)
+                    return BatchResult(error=e)
+            return BatchResult(response=response)
+
+        return list(await asyncio.gather(*(run(spec) for spec in requests)))
+
     async def close(self) -> None:
         """关闭HTTP连接池"""
         if not self.http_client.is_closed:
@@ -97,33 +207,52 @@ class RestClient:
             method: str,
             path: str,
             **kwargs
-    ) -> Optional[httpx.Response]:
+    ) -> Optional[CachedResponse]:
         """执行请求的核心流程"""
         __tracebackhide__ = True
 
         try:
-            # 记录请求日志
-            if self._enable_log:
-                self._log_request_details(method, path, **kwargs)
-
-            # 发送HTTP请求
-            response = await self._send_http_request(method, path, **kwargs)
-
-            # 记录响应日志
-            if self._enable_log:
-                self._log_response_details(response)
-
-            return response
-
+            return await self._perform_request(method, path, **kwargs)
         except httpx.RequestError as e:
             self._handle_network_error(e)
         except Exception as e:
             self._handle_unexpected_error(e)
 
+    async def _perform_request(
+            self,
+            method: str,
+            path: str,
+            **kwargs
+    ) -> CachedResponse:
+        """记录日志并发送请求，异常直接抛出由调用方处理"""
+        log_entry = None
+        # 记录请求日志
+        if self._enable_log:
+            if self.deferred_log:
+                log_entry = RequestLog.active().record(self, method, path, kwargs)
+            else:
+                self._log_request_details(method, path, **kwargs)
+
+        # 发送HTTP请求
+        timer = RequestTimer() if latency_recorder.enabled else None
+        response = CachedResponse(await self._send_http_request(method, path, timer=timer, **kwargs))
+        if timer is not None:
+            timer.stop()
+            latency_recorder.add(method, kwargs.get("endpoint") or path, timer)
+
+        # 记录响应日志
+        if log_entry is not None:
+            log_entry[-1] = response
+        elif self._enable_log:
+            self._log_response_details(response)
+
+        return response
+
     async def _send_http_request(
             self,
             method: str,
             path: str,
+            timer: Optional[RequestTimer] = None,
             **kwargs
     ) -> httpx.Response:
         """发送HTTP请求的统一入口"""
@@ -138,6 +267,8 @@ class RestClient:
             "files": kwargs.get("files"),
             "timeout": kwargs.get("timeout")
         }
+        if timer is not None:
+            request_args["extensions"] = {"trace": timer.trace}
 
         # 特殊处理DELETE请求体
         if method == "DELETE" and (kwargs.get("data") or kwargs.get("json")):
@@ -166,14 +297,15 @@ class RestClient:
             "cookies": kwargs.get("cookies")
         }
 
-        logger.debug("Request Details:\n%s", utils.json_dumps(log_payload))
+        formatted_payload = utils.json_dumps(log_payload)
+        logger.debug("Request Details:\n%s", formatted_payload)
         allure.attach(
-            body=utils.json_dumps(log_payload),
+            body=formatted_payload,
             name=f"Request {method} {path}",
             attachment_type=allure.attachment_type.JSON
         )
 
-    def _log_response_details(self, response: httpx.Response) -> None:
+    def _log_response_details(self, response: CachedResponse) -> None:
         """记录响应详细信息到日志和Allure"""
         try:
             content = response.json()
@@ -184,13 +316,13 @@ class RestClient:
             formatted_content = content
             content_type = allure.attachment_type.TEXT
 
-        log_data = {
-            "status": response.status_code,
-            "headers": self._filter_sensitive_data(dict(response.headers)),
-            "content": self._filter_sensitive_data(content)
-        }
-
-        logger.debug("Response Summary:\n%s", utils.json_dumps(log_data))
+        if logger.isEnabledFor(logging.DEBUG):
+            log_data = {
+                "status": response.status_code,
+                "headers": self._filter_sensitive_data(dict(response.headers)),
+                "content": self._filter_sensitive_data(content)
+            }
+            logger.debug("Response Summary:\n%s", utils.json_dumps(log_data))
         allure.attach(
             body=formatted_content,
             name=f"Response {response.status_code}",
@@ -1,8 +1,5 @@
-import json
-
-import httpx
-
 from enum import Enum, auto
+from core.response import CachedResponse
 from utils.schema import generate_json_schema
 from typing import Optional, Any
 
@@ -14,15 +11,22 @@ class ContentType(Enum):
 
 class ResultBase:
     """
-    响应结果的封装类
+    响应结果的封装类，使用 __slots__ 声明全部字段
     """
-    response: Optional[httpx.Response] = None
 
-    msg: Optional[str] = None
-    success: bool = False
+    __slots__ = ("response", "msg", "success", "error", "code", "data")
+
+    def __init__(self):
+        self.response: Optional[CachedResponse] = None
 
-    error: Optional[str] = None
-    code: Optional[int | str] = None
+        self.msg: Optional[str] = None
+        self.success: bool = False
+
+        self.error: Optional[str] = None
+        self.code: Optional[int | str] = None
+
+        # 关键字层解析出的业务数据
+        self.data: Any = None
 
     def schema(self) -> str:
         """
@@ -31,12 +35,7 @@ class ResultBase:
         return generate_json_schema(self.response.json())
 
     def content(self) -> tuple[str, ContentType]:
-        try:
-            self.response.json()
-            content_type = ContentType.json_type
-        except json.decoder.JSONDecodeError:
-            content_type = ContentType.text_type
-
+        content_type = ContentType.json_type if self.response.is_json else ContentType.text_type
         return self.response.text, content_type
 
     def json(self) -> Any:
@@ -0,0 +1,18 @@
+import httpx
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """
+    共享传输层（连接池）的视图
+
+    客户端关闭时会关闭自己的传输层，用该视图创建的客户端可以正常关闭，被包装的传输层由创建者负责关闭
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
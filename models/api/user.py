@@ -1,20 +1,25 @@
 import httpx
 
-from core import RestClient
+from core import RestClient, CachedResponse
 
 
 class User(RestClient):
     prefix: str = "/api/v1"
+    user_variable_endpoint: str = f"{prefix}/user/actions/variables/{{name}}"
 
-    def __init__(self, http_client: httpx.AsyncClient):
-        super().__init__(http_client)
+    def __init__(self, http_client: httpx.AsyncClient, enable_log: bool = True):
+        super().__init__(http_client, enable_log=enable_log)
 
-    async def user_info(self, **kwargs) -> httpx.Response:
+    async def user_info(self, **kwargs) -> CachedResponse:
         return await self.get(f"{self.prefix}/user", **kwargs)
 
-    async def user_variable(self, variable_name, **kwargs) -> httpx.Response:
+    def user_variable_path(self, variable_name) -> str:
+        return self.user_variable_endpoint.format(name=variable_name)
+
+    async def user_variable(self, variable_name, **kwargs) -> CachedResponse:
         method = kwargs.pop("method")
-        path = f"{self.prefix}/user/actions/variables/{variable_name}"
+        path = self.user_variable_path(variable_name)
+        kwargs.setdefault("endpoint", self.user_variable_endpoint)
 
         if method == "post":
             return await self.post(path, **kwargs)
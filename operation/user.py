@@ -1,14 +1,14 @@
 import allure
 import httpx
 
-from core import ResultBase
+from core import ResultBase, BatchResult
 from models.api import User
 from typing import Optional
 
 
 class UserOpn:
-    def __init__(self, http_client: httpx.AsyncClient):
-        self.api = User(http_client)
+    def __init__(self, http_client: httpx.AsyncClient, enable_log: bool = True):
+        self.api = User(http_client, enable_log=enable_log)
 
     @allure.step("获取用户信息")
     async def get_user_info(self, basic_auth:  Optional[str] = None) -> ResultBase:
@@ -114,3 +114,58 @@ class UserOpn:
 
         result.response = resp
         return result
+
+    @allure.step("批量创建用户变量")
+    async def create_user_variables(self, variables: dict[str, str], basic_auth: Optional[str] = None,
+                                    concurrency: int = 10) -> list[ResultBase]:
+        header = {
+            "authorization": f"Basic {basic_auth}"
+        }
+        requests = [
+            {
+                "method": "POST",
+                "path": self.api.user_variable_path(name),
+                "endpoint": self.api.user_variable_endpoint,
+                "headers": header,
+                "json": {"value": value},
+            }
+            for name, value in variables.items()
+        ]
+
+        return [self._to_result(item) for item in await self.api.batch(requests, concurrency=concurrency)]
+
+    @allure.step("批量删除用户变量")
+    async def delete_user_variables(self, variable_names: list[str], basic_auth: Optional[str] = None,
+                                    concurrency: int = 10) -> list[ResultBase]:
+        header = {
+            "authorization": f"Basic {basic_auth}"
+        }
+        requests = [
+            {
+                "method": "DELETE",
+                "path": self.api.user_variable_path(name),
+                "endpoint": self.api.user_variable_endpoint,
+                "headers": header,
+            }
+            for name in variable_names
+        ]
+
+        return [self._to_result(item) for item in await self.api.batch(requests, concurrency=concurrency)]
+
+    @staticmethod
+    def _to_result(item: BatchResult) -> ResultBase:
+        result = ResultBase()
+        if not item.ok:
+            result.error = str(item.error)
+            return result
+
+        resp = item.response
+        try:
+            resp.raise_for_status()
+            result.success = True
+        except Exception as e:
+            result.msg = resp.json()["message"]
+            result.error = str(e)
+
+        result.response = resp
+        return result
@@ -0,0 +1,17 @@
+import argparse
+import sys
+from pathlib import Path
+
+rootdir = Path(__file__).parent.parent
+sys.path.insert(0, str(rootdir))
+
+from utils.scheduling import DurationHistory
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出测试耗时快照，供 --shard 在各机器上使用同一份历史划分分片")
+    parser.add_argument("--history", default=".pytest_cache/durations.sqlite3", help="耗时历史库，相对于项目根目录")
+    parser.add_argument("--output", default="durations.json", help="快照路径，相对于项目根目录")
+    args = parser.parse_args()
+
+    count = DurationHistory(rootdir / args.history).export(rootdir / args.output)
+    print(f"导出 {count} 条测试耗时到 {rootdir / args.output}")
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import base64
+import sys
+from pathlib import Path
+
+rootdir = Path(__file__).parent.parent
+sys.path.insert(0, str(rootdir))
+
+import httpx
+
+from core import ResultBase
+from operation import UserOpn
+from typing import Optional
+from utils import env, json_dumps, test_data, timestamp
+from utils.load_runner import LoadRunner, IterationError
+
+
+def get_basic_auth() -> str:
+    user_data = test_data.get_data(rootdir / "testcases" / "base_data.yaml")["init_admin_user"]
+    return base64.b64encode(
+        f"{user_data['username']}:{user_data['password']}".encode()).decode()
+
+
+def _status_code(result: ResultBase) -> Optional[int]:
+    return result.response.status_code if result.response is not None else None
+
+
+def user_variable_flow(opn: UserOpn, basic_auth: str):
+    """
+    用户变量增删改查场景，与 testcases/api/scenario_test 中的业务流程一致
+    """
+    run_id = timestamp()
+
+    async def flow(vu: int, iteration: int) -> None:
+        name = f"load_{run_id}_{vu}_{iteration}"
+        results = [
+            await opn.create_user_variable(name, value="1", basic_auth=basic_auth),
+            await opn.get_user_variable(name, basic_auth=basic_auth),
+            await opn.update_user_variable(name, value="2", new_name=f"{name}_2", basic_auth=basic_auth),
+            await opn.delete_user_variable(f"{name}_2", basic_auth=basic_auth),
+        ]
+        for result in results:
+            if not result.success:
+                raise IterationError(result.msg or result.error, _status_code(result))
+
+    return flow
+
+
+def user_info_flow(opn: UserOpn, basic_auth: str):
+    """
+    获取用户信息场景
+    """
+
+    async def flow(vu: int, iteration: int) -> None:
+        result = await opn.get_user_info(basic_auth)
+        if not result.success:
+            raise IterationError(result.msg or result.error, _status_code(result))
+
+    return flow
+
+
+SCENARIOS = {
+    "user_variable": user_variable_flow,
+    "user_info": user_info_flow,
+}
+
+
+async def main(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency or args.users,
+                          max_keepalive_connections=args.concurrency or args.users)
+    async with httpx.AsyncClient(base_url=env.BASE_URL, limits=limits) as http_client:
+        # 压测时不需要请求日志
+        opn = UserOpn(http_client, enable_log=False)
+        runner = LoadRunner(
+            SCENARIOS[args.scenario](opn, get_basic_auth()),
+            users=args.users,
+            duration=args.duration,
+            ramp_up=args.ramp_up,
+            rps=args.rps,
+            concurrency=args.concurrency,
+        )
+        return await runner.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="复用 operation 关键字的压测工具")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="user_variable", help="压测场景")
+    parser.add_argument("--users", type=int, default=10, help="虚拟用户数")
+    parser.add_argument("--duration", type=float, default=60, help="持续时间（秒）")
+    parser.add_argument("--ramp-up", type=float, default=0, help="虚拟用户全部启动所需时间（秒）")
+    parser.add_argument("--rps", type=float, default=None, help="目标每秒迭代数")
+    parser.add_argument("--concurrency", type=int, default=None, help="同时执行的最大迭代数")
+    parser.add_argument("--report", default="reports/load_report.json", help="报告路径，相对于项目根目录")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    report_file = rootdir / args.report
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    report_file.write_text(json_dumps(report), encoding="utf-8")
+
+    print(f"迭代次数: {report['iterations']}  错误率: {report['error_rate']:.2%}  "
+          f"吞吐量: {report['throughput']}/s  请求速率: {report['request_rate']}/s")
+    print(f"迭代耗时(ms): p50={report['iteration_latency']['p50']} "
+          f"p95={report['iteration_latency']['p95']} p99={report['iteration_latency']['p99']}")
+    print(f"报告已保存到 {report_file}")
@@ -0,0 +1,50 @@
+import argparse
+import shutil
+from pathlib import Path
+
+rootdir = Path(__file__).parent.parent
+
+
+def merge_allure_results(results_dir: Path, clean: bool = False) -> int:
+    """
+    把 results_dir 下各分片目录（shard-*）的 allure 结果合并到 results_dir
+
+    结果文件名为 uuid，不会冲突；附件按内容哈希命名，同名附件内容相同，只复制一次；
+    environment.properties 等公共文件以最后一个分片为准。
+    :param results_dir: allure 结果目录
+    :param clean: 合并后删除分片目录
+    :return: 合并的文件数
+    """
+    if not results_dir.is_dir():
+        print(f"{results_dir} 不存在")
+        return 0
+
+    # 清理上一次合并的结果，分片目录保留
+    for file in results_dir.iterdir():
+        if file.is_file():
+            file.unlink()
+
+    count = 0
+    shard_dirs = sorted(results_dir.glob("shard-*"), key=lambda d: int(d.name.split("-")[1]))
+    for shard_dir in shard_dirs:
+        for file in shard_dir.iterdir():
+            if not file.is_file():
+                continue
+            destination = results_dir / file.name
+            if "-attachment" in file.name and destination.exists():
+                continue
+            shutil.copy2(file, destination)
+            count += 1
+        if clean:
+            shutil.rmtree(shard_dir)
+    print(f"合并 {len(shard_dirs)} 个分片的 {count} 个文件到 {results_dir}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合并 --shard 分片运行生成的 allure 结果")
+    parser.add_argument("--results-dir", default="reports/allure_results", help="allure 结果目录，相对于项目根目录")
+    parser.add_argument("--clean", action="store_true", help="合并后删除分片目录")
+    args = parser.parse_args()
+
+    merge_allure_results(rootdir / args.results_dir, args.clean)
@@ -10,7 +10,7 @@ from utils.asserts import assert_result
 @allure.feature("用户模块")
 @allure.story("/api/v1/user")
 @allure.link("https://gitea.com/api/swagger#/user/userGetCurrent", name="to swagger")
-@pytest.mark.asyncio(loop_scope="class")
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.single
 class TestUserInfo:
 
@@ -25,6 +25,7 @@ class TestUserInfo:
     @allure.title("获取用户信息 {param_id}")
     @allure.description("验证获取当前登录的用户信息接口异常basic_auth")
     @pytest.mark.negative
+    @pytest.mark.concurrent
     async def test_user_info_with_basic_auth(self, user_opn, snapshot, test_data):
         basic_auth = test_data.basic_auth or base64.b64encode(
             f"{test_data.username}:{test_data.password}".encode()).decode()
@@ -33,6 +34,15 @@ class TestUserInfo:
 
         assert_result(result, test_data, snapshot)
 
+    @allure.title("获取用户信息 {param_id}")
+    @allure.description("验证获取当前登录的用户信息接口不存在的用户，用例数据从 unknown_users.csv 读取")
+    @pytest.mark.negative
+    async def test_user_info_with_unknown_user(self, user_opn, test_data):
+        result = await user_opn.get_user_info(base64.b64encode(
+            f"{test_data.username}:{test_data.password}".encode()).decode())
+
+        assert_result(result, test_data)
+
 
 if __name__ == '__main__':
     pytest.main(["-q", "-s", __file__])
@@ -2,14 +2,14 @@ import pytest
 import allure
 
 from utils.asserts import assert_result
-from utils.extensions import JSONSchemaSnapshotExtension
+from utils.extensions import schema_extension
 
 @allure.severity(allure.severity_level.NORMAL)
 @allure.epic("业务场景测试")
 @allure.feature("用户模块")
 @allure.story("用户变量")
 @allure.link("https://gitea.com/api/swagger#/user/createUserVariable", name="to swagger")
-@pytest.mark.asyncio(loop_scope="class")
+@pytest.mark.asyncio(loop_scope="session")
 @pytest.mark.multiple
 class TestUserVariable:
 
@@ -24,7 +24,7 @@ class TestUserVariable:
             test_data.variable_name, basic_auth=basic_auth)
         assert get_result.response.status_code == 200
         assert get_result.data["data"] == test_data.value
-        assert get_result.schema() == snapshot.use_extension(JSONSchemaSnapshotExtension)
+        assert get_result.schema() == snapshot.use_extension(schema_extension())
 
         update_result = await user_opn.update_user_variable(
             test_data.variable_name, value=test_data.update_value, new_name=test_data.update_name,
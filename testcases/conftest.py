@@ -1,7 +1,10 @@
 import asyncio
 import base64
+import importlib.util
 import logging
+import os
 import pathlib
+import random
 import sys
 import time
 import allure
@@ -10,8 +13,23 @@ import pytest
 import pytest_asyncio
 import utils
 
-from typing import AsyncGenerator
-from utils import test_data, TestData, env
+from allure_commons.model2 import TestResult, Label, Status
+from allure_commons.types import LabelType
+from allure_commons.utils import uuid4, now, md5
+from collections import defaultdict
+from typing import AsyncGenerator, Optional
+from core import RestClient, request_log, latency_recorder
+from core.cassette import CassetteTransport, current_test
+from core.transport import SharedTransport
+from utils import test_data, test_data_index, env, attachment_store, allure_writer, artifact_finalizer
+from utils import extensions
+from utils import concurrent_runner
+from utils.extensions import snapshot_write_stats
+from utils.data_source import SourceRow
+from utils.step_context import flush_steps, current_reporter
+from utils.step_profiler import step_profiler
+from utils.scheduling import (DurationHistory, LPTScheduling, schedule_stats, parse_shard, select_shard, split_scope,
+                              load_snapshot)
 
 # if sys.platform == 'win32':
 #     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -20,22 +38,552 @@ pytest.register_assert_rewrite('utils.asserts')
 
 logger = logging.getLogger(__name__)
 
+# 本次运行每个测试的耗时（秒），会话结束后写入耗时历史库
+test_durations: dict[str, float] = defaultdict(float)
+
+# 命令行指定的详细程度，log_cli 开启时 logging 插件会把 config.option.verbose 提升到 1，需在其之前记录
+requested_verbosity = 0
+
+# 流式数据源 subset 子集的哈希种子，由主进程在 pytest_configure 中确定
+test_data_seed = None
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("http", "http 请求日志")
+    group.addoption(
+        "--http-log-mode",
+        choices=("deferred", "eager"),
+        default="deferred",
+        help="请求/响应日志模式：deferred 仅在测试失败或被采样时附加到报告，eager 每次请求都附加",
+    )
+    group.addoption(
+        "--http-log-sample-rate",
+        type=float,
+        default=0.0,
+        help="deferred 模式下通过的测试附加请求日志的采样率 (0~1)",
+    )
+    group.addoption(
+        "--http-cassette",
+        choices=("off", *CassetteTransport.MODES),
+        default="off",
+        help="录制/回放模式：record 录制真实请求到磁带，replay 仅从磁带回放不访问网络",
+    )
+    group.addoption(
+        "--http-cassette-dir",
+        default="cassettes",
+        help="磁带文件目录，相对于项目根目录",
+    )
+    group.addoption(
+        "--http-client-scope",
+        choices=("function", "session"),
+        default="function",
+        help="http_client 的作用域：session 时所有测试共享同一客户端（含 headers 和 cookies）",
+    )
+    group.addoption(
+        "--http-max-connections",
+        type=int,
+        default=100,
+        help="连接池最大连接数",
+    )
+    group.addoption(
+        "--http-max-keepalive",
+        type=int,
+        default=20,
+        help="连接池最大保活连接数",
+    )
+    group.addoption(
+        "--http2",
+        action="store_true",
+        default=False,
+        help="启用 HTTP/2 多路复用（需要安装 h2）",
+    )
+    group.addoption(
+        "--http-warmup",
+        type=int,
+        default=4,
+        help="session 作用域下预先建立到 BASE_URL 的连接数",
+    )
+    group.addoption(
+        "--latency-report",
+        default="reports/latency.json",
+        help="按接口聚合的请求耗时报告路径，相对于项目根目录，为空时关闭耗时统计",
+    )
+
+    group = parser.getgroup("schema snapshot", "schema 快照")
+    group.addoption(
+        "--snapshot-store",
+        choices=("single", "packed"),
+        default="single",
+        help="schema 快照存储方式：single 每个用例一个文件，packed 每个测试模块一个去重的打包文件",
+    )
+
+    group = parser.getgroup("schedule", "测试调度")
+    group.addoption(
+        "--schedule",
+        choices=("default", "lpt"),
+        default="default",
+        help="xdist 调度方式：default 使用 --dist 指定的调度器，lpt 按历史耗时最长优先分发，同一个类的测试在同一个 worker 执行",
+    )
+    group.addoption(
+        "--shard",
+        default=None,
+        help="按历史耗时划分的分片，格式 i/n（i 从 1 开始），allure 结果写入 <alluredir>/shard-i",
+    )
+    group.addoption(
+        "--shard-durations",
+        default="durations.json",
+        help="--shard 划分使用的耗时快照（script/export_durations.py 导出），相对于项目根目录，"
+             "各分片需使用同一份快照，不存在时按测试分组名的哈希划分",
+    )
+    group.addoption(
+        "--duration-history",
+        default=".pytest_cache/durations.sqlite3",
+        help="测试耗时历史库路径，相对于项目根目录，为空时不记录，--shard 时只读取不写入",
+    )
+
+    group.addoption(
+        "--async-concurrency",
+        type=int,
+        default=10,
+        help="标记了 concurrent 的同一个类（或模块）中连续的异步测试在同一个事件循环中并发执行的最大数量，0 时关闭，xdist 下逐个执行",
+    )
+
+    group = parser.getgroup("allure attachments", "allure 附件")
+    group.addoption(
+        "--allure-attachment-store",
+        choices=("dedup", "plain"),
+        default="dedup",
+        help="附件存储方式：dedup 按内容哈希命名，相同内容只写入一次，plain 每次附加都写入新文件",
+    )
+    group.addoption(
+        "--allure-compress-threshold",
+        type=int,
+        default=0,
+        help="dedup 模式下超过该大小（KB）的文本附件以 gzip 压缩保存，报告中需下载查看，0 时不压缩",
+    )
+    group.addoption(
+        "--allure-writer-threads",
+        type=int,
+        default=2,
+        help="后台写入 allure 结果和附件的线程数，0 时在测试线程中同步写入",
+    )
+    group.addoption(
+        "--allure-writer-queue",
+        type=int,
+        default=1000,
+        help="后台写入队列容量，队列满时测试线程等待",
+    )
+
+    group = parser.getgroup("artifacts", "playwright 测试产物")
+    group.addoption(
+        "--artifacts-finalize",
+        choices=("inline", "background"),
+        default="inline",
+        help="视频和 trace 的收尾方式：inline 在测试 teardown 中完成，background 在后台完成，下一个测试无需等待",
+    )
+    group.addoption(
+        "--artifacts-workers",
+        type=int,
+        default=4,
+        help="移动、读取和删除测试产物文件的线程数",
+    )
+    group.addoption(
+        "--screenshot-buffer",
+        type=int,
+        default=1,
+        help="每个页面在内存中保留的最近截图数，大于 1 时页面每次加载完成也会截图（仅视口），测试失败时才附加到报告",
+    )
+    group.addoption(
+        "--screenshot-type",
+        choices=("png", "jpeg"),
+        default="png",
+        help="截图格式，jpeg 文件更小",
+    )
+    group.addoption(
+        "--screenshot-max-width",
+        type=int,
+        default=0,
+        help="附加到报告前把截图等比缩小到该宽度（像素，需要安装 Pillow），0 时不缩小",
+    )
+
+    group = parser.getgroup("step profile", "步骤耗时统计")
+    group.addoption(
+        "--step-profile",
+        default="",
+        help="按步骤标题模板统计 allure 步骤的 wall/self 耗时，写入 collapsed 调用栈文件（可生成火焰图），"
+             "路径相对于项目根目录，为空时关闭",
+    )
+    group.addoption(
+        "--step-profile-top",
+        type=int,
+        default=20,
+        help="测试结束后输出 self 耗时最高的步骤数量",
+    )
+
+    group = parser.getgroup("test data", "测试数据")
+    group.addoption(
+        "--test-data-seed",
+        default=None,
+        help="流式数据源 subset 子集的哈希种子，默认每次运行不同（--lf/--ff 时沿用上次的种子），指定后可复现同一子集",
+    )
+
 
 def pytest_configure(config):
     """
     pytest 钩子函数 强制让日志和a llure 报告文件生成在指定的位置
     """
+    global requested_verbosity, test_data_seed
     rootdir = config.rootdir  # 项目根目录
     utils.rootdir = rootdir
+    requested_verbosity = config.option.verbose
+    if not hasattr(config, "workerinput"):
+        test_data_seed = _resolve_test_data_seed(config)
     # 日志文件路径
     log_file = config.getoption('--log-file') or config.getini('log_file')
     if log_file:
         config.option.log_file = rootdir / \
                                  log_file.format(time.strftime("%Y%m%d"))
-    # allure-pytest报告数据路径
+    # 分片
+    shard = config.getoption("--shard")
+    if shard:
+        try:
+            parse_shard(shard)
+        except ValueError as e:
+            raise pytest.UsageError(str(e))
+    # allure-pytest报告数据路径，分片时每个分片使用单独的目录，由 script/merge_allure_results.py 合并
     allure_report_dir = config.getoption('--alluredir')
     if allure_report_dir:
         config.option.allure_report_dir = rootdir / allure_report_dir
+        if shard:
+            config.option.allure_report_dir = config.option.allure_report_dir / f"shard-{parse_shard(shard)[0]}"
+    # 录制前清空磁带目录，xdist 下只由主进程清空
+    if config.getoption("--http-cassette") == "record" and not hasattr(config, "workerinput"):
+        CassetteTransport.clear(_cassette_dir(config))
+    # 请求日志模式
+    RestClient.deferred_log = config.getoption("--http-log-mode") == "deferred"
+    if config.getoption("--http2") and importlib.util.find_spec("h2") is None:
+        raise pytest.UsageError("--http2 需要安装 h2：pip install 'httpx[http2]'")
+    latency_recorder.enabled = bool(config.getoption("--latency-report"))
+    step_profiler.enabled = bool(config.getoption("--step-profile"))
+    # allure 附件存储
+    attachment_store.enabled = config.getoption("--allure-attachment-store") == "dedup"
+    attachment_store.report_dir = pathlib.Path(config.option.allure_report_dir) if allure_report_dir else None
+    attachment_store.compress_threshold = config.getoption("--allure-compress-threshold") * 1024
+    # playwright 测试产物收尾
+    artifact_finalizer.background = config.getoption("--artifacts-finalize") == "background"
+    artifact_finalizer.max_workers = config.getoption("--artifacts-workers")
+    if config.getoption("--screenshot-max-width") > 0 and importlib.util.find_spec("PIL") is None:
+        raise pytest.UsageError("--screenshot-max-width 需要安装 Pillow：pip install pillow")
+    if allure_report_dir and not config.option.collectonly:
+        allure_writer.start(config.getoption("--allure-writer-threads"), config.getoption("--allure-writer-queue"))
+    # schema 快照存储方式
+    extensions.snapshot_store = config.getoption("--snapshot-store")
+    # 异步测试并发数
+    concurrent_runner.concurrency_limit = config.getoption("--async-concurrency")
+    if concurrent_runner.concurrency_limit > 0 and (mismatched := concurrent_runner.check_versions()):
+        concurrent_runner.concurrency_limit = 0
+        config.issue_config_time_warning(pytest.PytestConfigWarning(
+            f"--async-concurrency 已关闭，依赖版本未经验证: {', '.join(mismatched)}"), stacklevel=2)
+    # xdist worker 加载主进程构建的测试数据索引
+    if hasattr(config, "workerinput") and "test_data_index" in config.workerinput:
+        test_data_index.load(config.workerinput["test_data_index"])
+
+
+def _cassette_dir(config) -> pathlib.Path:
+    return config.rootpath / config.getoption("--http-cassette-dir")
+
+
+def _resolve_test_data_seed(config):
+    """
+    确定流式数据源 subset 子集的哈希种子：--test-data-seed 优先，回放磁带时使用录制时的种子，
+    --lf/--ff 重跑时沿用缓存中上次运行的种子，使失败的用例仍被选中；否则使用当前时间。种子写入缓存并显示在报告头
+    """
+    cache = getattr(config, "cache", None)
+    seed = config.getoption("--test-data-seed")
+    if seed is None and config.getoption("--http-cassette") == "replay":
+        meta = CassetteTransport.read_meta(_cassette_dir(config))
+        seed = meta.get("seed", meta.get("timestamp"))
+    if seed is None and cache is not None and (config.getoption("lf", False) or config.getoption("failedfirst", False)):
+        seed = cache.get("test_data/seed", None)
+    if seed is None:
+        seed = utils.timestamp()
+    if cache is not None:
+        cache.set("test_data/seed", seed)
+    return seed
+
+
+def pytest_report_header(config):
+    """
+    pytest 钩子函数 报告头显示测试数据种子，失败的数据源用例可用 --test-data-seed 复现
+    """
+    return f"test data seed: {test_data_seed}"
+
+
+def _build_test_data_index(config) -> None:
+    """
+    构建测试数据索引，回放磁带时使用录制时的时间戳，使 {timestamp} 渲染出与录制时相同的请求和预期结果
+    """
+    ts = None
+    if config.getoption("--http-cassette") == "replay":
+        ts = CassetteTransport.read_meta(_cassette_dir(config)).get("timestamp")
+    test_data_index.build(pathlib.Path(__file__).parent, ts=ts, seed=test_data_seed)
+
+
+def _duration_history(config) -> Optional[DurationHistory]:
+    history_file = config.getoption("--duration-history")
+    return DurationHistory(config.rootpath / history_file) if history_file else None
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    """
+    xdist 钩子函数 --schedule=lpt 时使用基于历史耗时的调度器
+    """
+    if config.getoption("--schedule") == "lpt":
+        history = _duration_history(config)
+        return LPTScheduling(config, log, history=history.load() if history else {})
+
+
+def _test_data_index_file(config) -> pathlib.Path:
+    return config.rootpath / ".pytest_cache" / "test_data" / f"index-{os.getpid()}.pickle"
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    xdist 钩子函数 主进程构建一次测试数据索引并共享给所有 worker
+    """
+    index_file = _test_data_index_file(node.config)
+    if not test_data_index.built:
+        _build_test_data_index(node.config)
+        test_data_index.save(index_file)
+    node.workerinput["test_data_index"] = str(index_file)
+
+
+def pytest_sessionfinish(session):
+    """
+    pytest 钩子函数 xdist worker 回传耗时样本、快照写入统计和步骤耗时，主进程汇总后写入耗时报告
+    """
+    config = session.config
+    allure_writer.flush()
+    if hasattr(config, "workerinput"):
+        config.workeroutput["allure_writer"] = dict(allure_writer.stats)
+        config.workeroutput["snapshot_writes"] = dict(snapshot_write_stats)
+        if latency_recorder.enabled:
+            config.workeroutput["latency"] = latency_recorder.export()
+        if step_profiler.enabled:
+            config.workeroutput["step_profile"] = step_profiler.export()
+        config.workeroutput["attachments"] = dict(attachment_store.stats)
+        return
+    if latency_recorder.enabled and latency_recorder.samples:
+        report = utils.json_dumps(latency_recorder.report())
+        report_file = config.rootpath / config.getoption("--latency-report")
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+        report_file.write_text(report, encoding="utf-8")
+        _attach_latency_summary(report)
+    if step_profiler.enabled and step_profiler.stacks:
+        step_profiler.write_collapsed(config.rootpath / config.getoption("--step-profile"))
+    _test_data_index_file(config).unlink(missing_ok=True)
+    if config.getoption("--http-cassette") == "record" and test_data_index.built:
+        CassetteTransport.write_meta(_cassette_dir(config),
+                                     {"timestamp": test_data_index.timestamp, "seed": test_data_index.seed})
+    # 分片运行时各分片进程可能同时运行，不写入耗时历史
+    history = _duration_history(config)
+    if history and not config.getoption("--shard"):
+        history.record(test_durations)
+
+
+def _attach_latency_summary(report: str) -> None:
+    """
+    合并后的耗时报告作为单独的 allure 结果附加，xdist 下只由主进程附加一次
+    """
+    reporter = current_reporter()
+    if reporter is None:
+        return
+    uuid = uuid4()
+    timestamp = now()
+    reporter.schedule_test(uuid, TestResult(
+        uuid=uuid,
+        name="请求耗时统计",
+        fullName="latency_summary",
+        historyId=md5("latency_summary"),
+        start=timestamp,
+        stop=timestamp,
+        status=Status.PASSED,
+        labels=[Label(name=LabelType.SUITE, value="请求耗时统计")],
+    ))
+    reporter.attach_data(uuid4(), report, name="Latency Summary", attachment_type=allure.attachment_type.JSON,
+                         parent_uuid=uuid)
+    reporter.close_test(uuid)
+
+
+def pytest_unconfigure(config):
+    """
+    pytest 钩子函数 等待 session 作用域 fixture teardown 后的 allure 结果写入完成
+    """
+    allure_writer.flush()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """
+    xdist 钩子函数 合并 worker 回传的耗时样本、快照写入统计和步骤耗时
+    """
+    workeroutput = getattr(node, "workeroutput", {})
+    latency_recorder.merge(workeroutput.get("latency", {}))
+    step_profiler.merge(workeroutput.get("step_profile", {}))
+    attachment_store.stats.update(workeroutput.get("attachments", {}))
+    allure_writer.merge(workeroutput.get("allure_writer", {}))
+    for key, count in workeroutput.get("snapshot_writes", {}).items():
+        snapshot_write_stats[key] += count
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    pytest 钩子函数 回放磁带时跳过标记了 no_cassette 的测试；
+    --shard=i/n 时只保留分到当前分片的测试，同一个类的测试总在同一个分片，划分只依据 --shard-durations 快照
+    """
+    if config.getoption("--http-cassette") == "replay":
+        skip = pytest.mark.skip(reason="请求依赖每次运行不同的数据，无法从磁带回放")
+        for item in items:
+            if item.get_closest_marker("no_cassette"):
+                item.add_marker(skip)
+
+    shard = config.getoption("--shard")
+    if not shard:
+        return
+    index, total = parse_shard(shard)
+    history = load_snapshot(config.rootpath / config.getoption("--shard-durations"))
+    scopes = select_shard([item.nodeid for item in items], history, index, total)
+
+    selected = []
+    deselected = []
+    for item in items:
+        (selected if split_scope(item.nodeid) in scopes else deselected).append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+def pytest_runtest_logreport(report):
+    """
+    pytest 钩子函数 累计每个测试 setup、call、teardown 的耗时，xdist 下由主进程汇总 worker 的报告
+    """
+    test_durations[report.nodeid] += report.duration
+
+
+def pytest_terminal_summary(terminalreporter):
+    """
+    pytest 钩子函数 输出 schema 快照实际写入的数量、LPT 调度的 makespan、allure 附件和写入队列统计以及耗时最高的步骤
+    """
+    if schedule_stats.predicted is not None:
+        terminalreporter.write_line(
+            f"lpt schedule: predicted makespan {schedule_stats.predicted:.2f}s, "
+            f"actual {schedule_stats.actual_makespan:.2f}s "
+            f"({schedule_stats.workers} workers, {schedule_stats.scopes} groups, "
+            f"{schedule_stats.unknown} tests without history)")
+    if any(snapshot_write_stats.values()):
+        terminalreporter.write_line(
+            f"schema snapshots: {snapshot_write_stats['written']} written, "
+            f"{snapshot_write_stats['unchanged']} unchanged (skipped)")
+    if attachment_store.stats["deduplicated"] or attachment_store.stats["saved_bytes"]:
+        terminalreporter.write_line(
+            f"allure attachments: {attachment_store.stats['stored']} stored, "
+            f"{attachment_store.stats['deduplicated']} deduplicated, "
+            f"{attachment_store.stats['saved_bytes'] / 1024 / 1024:.1f} MB saved")
+    stats = allure_writer.stats
+    # 写入线程阻塞测试或写入失败时才需要关注，否则仅在 -v 下显示
+    if stats["writes"] and (requested_verbosity > 0 or stats["blocked"] > 0 or stats["errors"]):
+        terminalreporter.write_line(
+            f"allure writer: {stats['writes']} writes in {stats['batches']} batches, "
+            f"max queue depth {stats['max_depth']}/{terminalreporter.config.getoption('--allure-writer-queue')}, "
+            f"blocked {stats['blocked']:.2f}s, {stats['errors']} errors")
+    top = step_profiler.top(terminalreporter.config.getoption("--step-profile-top"))
+    if top:
+        terminalreporter.write_sep("-", "slowest steps (self time)")
+        terminalreporter.write_line(f"{'count':>8} {'wall(s)':>10} {'self(s)':>10}  step")
+        for title, count, wall, self_time in top:
+            terminalreporter.write_line(f"{count:>8} {wall:>10.3f} {self_time:>10.3f}  {title}")
+        terminalreporter.write_line(f"collapsed stacks written to {terminalreporter.config.getoption('--step-profile')}")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtestloop(session):
+    """
+    pytest 钩子函数 存在并发测试时使用允许批量取出测试的测试循环，xdist 下不分批，按默认方式逐个执行
+    """
+    config = session.config
+    if hasattr(config, "workerinput") or config.pluginmanager.has_plugin("dsession"):
+        return None
+    if any(concurrent_runner.is_concurrent(item) for item in session.items):
+        return concurrent_runner.runtestloop(session)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_protocol(item, nextitem):
+    """
+    pytest 钩子函数 同一个类中连续的 concurrent 异步测试分批在同一个事件循环中并发执行
+    """
+    return concurrent_runner.run_protocol(item, nextitem)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """
+    pytest 钩子函数 回放并发执行的测试结果
+    """
+    return concurrent_runner.replay(pyfuncitem)
+
+
+def pytest_runtest_setup(item):
+    """
+    pytest 钩子函数 每个测试开始前清空请求日志缓冲区，设置磁带中请求所属的测试
+    """
+    request_log.clear()
+    current_test.set(item.nodeid)
+
+
+def pytest_runtest_logfinish(nodeid, location):
+    """
+    pytest 钩子函数 allure 写出测试结果前写入缓冲的步骤
+    """
+    flush_steps()
+
+
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_fixture_setup(fixturedef, request):
+    """
+    pytest 钩子函数 allure 结束 fixture 的 setup 前写入其中缓冲的步骤（trylast 的包装在 allure 的包装之内）
+    """
+    yield
+    flush_steps()
+
+
+def pytest_fixture_post_finalizer(fixturedef, request):
+    """
+    pytest 钩子函数 allure 写出 fixture 容器前写入 fixture 中缓冲的步骤
+    """
+    flush_steps()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """
+    pytest 钩子函数 测试失败或被采样命中时将缓冲的请求日志附加到报告
+    """
+    outcome = yield
+    report = outcome.get_result()
+    concurrent_runner.adjust_report(item, report)
+    if not RestClient.deferred_log:
+        return
+
+    if report.failed:
+        request_log.flush()
+    elif report.when == "call" and report.passed:
+        if random.random() < item.config.getoption("--http-log-sample-rate"):
+            request_log.flush()
+    elif report.when == "teardown":
+        request_log.clear()
 
 
 def pytest_generate_tests(metafunc):
@@ -43,35 +591,27 @@ def pytest_generate_tests(metafunc):
     pytest 钩子函数 当测试函数使用了 test_data fixture 时自动填充数据
     """
     if "test_data" in metafunc.fixturenames:
-        node = metafunc.definition
-        test_module_dir = node.fspath.dirpath()
-        test_name = node.originalname
-
-        data = test_data.get_data(
-            test_module_dir / "test_data.yaml").get(test_name)
+        if not test_data_index.built:
+            _build_test_data_index(metafunc.config)
 
-        if type(data) == dict:
-            case_name = data.get("case_name", "test")
-
-            metafunc.parametrize(
-                "test_data", [TestData(**data)], ids=[case_name])
-        elif type(data) == list and len(data) >= 2:
-            # 获取字段名（头部）和数据值（内容）
-            field_names = data[0][1:]
-            timestamp = utils.timestamp()
-            ids = []
-            values = []
+        node = metafunc.definition
+        table = test_data_index.get(node.path.parent, node.originalname)
+        if table is not None:
+            metafunc.parametrize("test_data", table.parameters(test_data_index.context), ids=table.ids,
+                                 indirect=table.indirect)
 
-            for value in data[1:]:
-                ids.append(value[0].format(timestamp=timestamp))
-                values.append(list(map(lambda x: x.format(
-                    timestamp=timestamp) if type(x) == str else x, value[1:])))
-            # 将数据值映射为字典列表
-            objects = [TestData(**dict(zip(field_names, value)))
-                       for value in values]
 
-            # 参数化测试
-            metafunc.parametrize("test_data", objects, ids=ids)
+@pytest.fixture(name="test_data")
+def source_test_data(request):
+    """
+    流式数据源的用例数据，测试执行时才按行偏移量读取并创建 TestData
+    """
+    row = getattr(request, "param", None)
+    if not isinstance(row, SourceRow):
+        raise pytest.UsageError(
+            f"{request.node.nodeid} 使用了 test_data，"
+            f"但 {request.path.parent / test_data_index.FILE_NAME} 中没有 {request.function.__name__} 的测试数据")
+    return row.load(test_data_index.context)
 
 
 @pytest.fixture(scope="session")
@@ -86,16 +626,67 @@ def basic_auth() -> str:
     return basic_auth
 
 
-@pytest_asyncio.fixture(scope="session")
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 @allure.title("创建http transport")
-async def http_transport():
-    transport = httpx.AsyncHTTPTransport(retries=3)
+async def http_transport(pytestconfig):
+    """
+    连接池绑定创建它的事件循环，使用它的测试需运行在 session 作用域的事件循环中：@pytest.mark.asyncio(loop_scope="session")
+    """
+    cassette_mode = pytestconfig.getoption("--http-cassette")
+    if cassette_mode == "replay":
+        transport = CassetteTransport(_cassette_dir(pytestconfig), cassette_mode)
+    else:
+        transport = httpx.AsyncHTTPTransport(
+            retries=3,
+            http2=pytestconfig.getoption("--http2"),
+            limits=httpx.Limits(
+                max_connections=pytestconfig.getoption("--http-max-connections"),
+                max_keepalive_connections=pytestconfig.getoption("--http-max-keepalive"),
+            ),
+        )
+        if cassette_mode == "record":
+            transport = CassetteTransport(
+                _cassette_dir(pytestconfig),
+                cassette_mode,
+                transport,
+                name=getattr(pytestconfig, "workerinput", {}).get("workerid", "master"),
+            )
     yield transport
     await transport.aclose()
 
 
-@pytest_asyncio.fixture(scope="function")
-@allure.title("创建http客户端")
-async def http_client(http_transport) -> AsyncGenerator[httpx.AsyncClient, None]:
-    async with httpx.AsyncClient(base_url=env.BASE_URL, transport=http_transport) as client:
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+@allure.title("创建共享http客户端")
+async def shared_http_client(pytestconfig, http_transport) -> AsyncGenerator[httpx.AsyncClient, None]:
+    client = httpx.AsyncClient(base_url=env.BASE_URL, transport=SharedTransport(http_transport))
+    warmup = pytestconfig.getoption("--http-warmup")
+    if warmup > 0 and pytestconfig.getoption("--http-cassette") == "off":
+        # HTTP/2 单连接即可多路复用
+        count = 1 if pytestconfig.getoption("--http2") else warmup
+        results = await asyncio.gather(
+            *(client.head("/") for _ in range(count)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.warning(f"预建连接失败 {len(errors)}/{count}: {errors[0]}")
+    yield client
+    # 只关闭客户端，连接池由 http_transport 负责关闭
+    await client.aclose()
+
+
+@pytest_asyncio.fixture(scope="function", loop_scope="session")
+@allure.title("创建隔离的http客户端")
+async def isolated_http_client(http_transport) -> AsyncGenerator[httpx.AsyncClient, None]:
+    async with httpx.AsyncClient(base_url=env.BASE_URL, transport=SharedTransport(http_transport)) as client:
         yield client
+
+
+@pytest.fixture(scope="function")
+@allure.title("创建http客户端")
+def http_client(request, pytestconfig) -> httpx.AsyncClient:
+    """
+    session 作用域下返回共享客户端，标记了 isolated_client 的测试获得独立 headers 和 cookies 的客户端
+    """
+    if (pytestconfig.getoption("--http-client-scope") == "session"
+            and not request.node.get_closest_marker("isolated_client")):
+        return request.getfixturevalue("shared_http_client")
+    return request.getfixturevalue("isolated_http_client")
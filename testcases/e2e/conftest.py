@@ -1,9 +1,11 @@
 import logging
+import tempfile
 import pytest
-from playwright.async_api import Page
+import pytest_asyncio
+from playwright.async_api import Browser, Page
 
 from models.ui import LoginPage
-from utils import env
+from utils import env, artifact_finalizer
 from urllib import parse
 import os
 from datetime import datetime
@@ -33,6 +35,18 @@ def browser_context_args(browser_context_args):
     }
 
 
+@pytest_asyncio.fixture(scope="session", loop_scope="session", autouse=True)
+async def artifacts_finalizer(browser: Browser, _pw_artifacts_folder: tempfile.TemporaryDirectory):
+    """
+    --artifacts-finalize=background 时，在关闭浏览器和删除 playwright 临时目录（视频和 trace 所在）前等待后台收尾完成，
+    收尾失败时该 fixture 的 teardown 报错
+    """
+    yield artifact_finalizer
+    if artifact_finalizer.pending:
+        logger.info(f"等待 {artifact_finalizer.pending} 个测试产物收尾任务完成")
+    await artifact_finalizer.drain()
+
+
 @pytest.fixture()
 def login_page(page: Page):
     return LoginPage(page)
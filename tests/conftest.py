@@ -0,0 +1,14 @@
+import pathlib
+
+import pytest
+
+pytest_plugins = ["pytester"]
+
+ROOT = pathlib.Path(__file__).parent.parent
+
+
+@pytest.fixture
+def project_path(monkeypatch) -> pathlib.Path:
+    """子进程中运行的 pytest 可以导入项目的 core 和 utils"""
+    monkeypatch.setenv("PYTHONPATH", str(ROOT))
+    return ROOT
@@ -0,0 +1,112 @@
+import gzip
+import json
+
+import pytest
+
+INNER_CONFTEST = """
+import asyncio
+import itertools
+import json
+import os
+
+import httpx
+import pytest
+
+from core.cassette import CassetteTransport, current_test
+
+MODE = os.environ["CASSETTE_MODE"]
+CASSETTE_DIR = os.environ["CASSETTE_DIR"]
+counter = itertools.count(1)
+
+
+def backend(request):
+    if MODE == "replay":
+        raise AssertionError("replay must not reach the network")
+    if request.url.path == "/user":
+        if request.headers.get("authorization") == "good":
+            return httpx.Response(200, json={"login": "alice"})
+        return httpx.Response(401, json={"message": "unauthorized"})
+    return httpx.Response(200, json={"count": next(counter)})
+
+
+def pytest_configure(config):
+    if MODE == "record" and not hasattr(config, "workerinput"):
+        CassetteTransport.clear(CASSETTE_DIR)
+
+
+def pytest_runtest_setup(item):
+    current_test.set(item.nodeid)
+
+
+@pytest.fixture(scope="session")
+def results(worker_id):
+    results = {}
+    yield results
+    with open(f"results-{MODE}-{worker_id}.json", "w") as f:
+        json.dump(results, f)
+
+
+@pytest.fixture(scope="session")
+def transport(worker_id):
+    transport = CassetteTransport(CASSETTE_DIR, MODE, httpx.MockTransport(backend), name=worker_id)
+    yield transport
+    asyncio.run(transport.aclose())
+
+
+@pytest.fixture
+def get(request, transport, results):
+    client = httpx.AsyncClient(base_url="http://test", transport=transport)
+
+    def get(path, auth):
+        response = asyncio.run(client.get(path, headers={"Authorization": auth}))
+        results.setdefault(request.node.nodeid, []).append([response.status_code, response.json()])
+
+    return get
+"""
+
+INNER_TESTS = """
+import pytest
+
+
+@pytest.mark.parametrize("auth", ["good", "bad"])
+def test_user(get, auth):
+    get("/user", auth)
+
+
+@pytest.mark.parametrize("n", range(4))
+def test_counter(get, n):
+    get("/counter", "good")
+    get("/counter", "good")
+"""
+
+
+def _results(pytester, mode):
+    results = {}
+    for file in pytester.path.glob(f"results-{mode}-*.json"):
+        results.update(json.loads(file.read_text()))
+    return results
+
+
+@pytest.mark.parametrize("record_workers", ["0", "2"])
+def test_record_replay_round_trip_under_xdist(pytester, monkeypatch, project_path, record_workers):
+    """录制的响应在 xdist 下回放时仍交给录制它的测试，不同凭据的同一接口分别回放"""
+    pytester.makeconftest(INNER_CONFTEST)
+    pytester.makepyfile(test_inner=INNER_TESTS)
+    cassette_dir = pytester.path / "cassettes"
+    cassette_dir.mkdir()
+    # 之前录制遗留的磁带不能混入回放
+    with gzip.open(cassette_dir / "gw7.json.gz", "wt") as f:
+        json.dump({"test_inner.py::test_user[good]": {}}, f)
+    monkeypatch.setenv("CASSETTE_DIR", str(cassette_dir))
+
+    monkeypatch.setenv("CASSETTE_MODE", "record")
+    pytester.runpytest_subprocess("-n", record_workers, "-p", "no:cacheprovider").assert_outcomes(passed=6)
+    assert not (cassette_dir / "gw7.json.gz").exists()
+
+    monkeypatch.setenv("CASSETTE_MODE", "replay")
+    pytester.runpytest_subprocess("-n", "2", "-p", "no:cacheprovider").assert_outcomes(passed=6)
+
+    recorded = _results(pytester, "record")
+    assert recorded["test_inner.py::test_user[good]"] == [[200, {"login": "alice"}]]
+    assert recorded["test_inner.py::test_user[bad]"] == [[401, {"message": "unauthorized"}]]
+    assert _results(pytester, "replay") == recorded
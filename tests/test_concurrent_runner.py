@@ -0,0 +1,164 @@
+import json
+
+import pytest
+
+INNER_CONFTEST = """
+import json
+
+import pytest
+
+from utils import concurrent_runner
+from utils.step_context import flush_steps
+
+EVENTS = []
+
+
+def pytest_configure(config):
+    concurrent_runner.concurrency_limit = 10
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtestloop(session):
+    config = session.config
+    if hasattr(config, "workerinput") or config.pluginmanager.has_plugin("dsession"):
+        return None
+    if any(concurrent_runner.is_concurrent(item) for item in session.items):
+        return concurrent_runner.runtestloop(session)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_protocol(item, nextitem):
+    return concurrent_runner.run_protocol(item, nextitem)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    return concurrent_runner.replay(pyfuncitem)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    concurrent_runner.adjust_report(item, outcome.get_result())
+
+
+def pytest_runtest_logfinish(nodeid, location):
+    flush_steps()
+
+
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_fixture_setup(fixturedef, request):
+    yield
+    flush_steps()
+
+
+def pytest_fixture_post_finalizer(fixturedef, request):
+    flush_steps()
+
+
+def pytest_runtest_logreport(report):
+    EVENTS.append(["report", report.nodeid.split("::")[-1], report.when, report.outcome])
+
+
+@pytest.fixture
+def per_test(request):
+    EVENTS.append(["setup", request.node.name])
+    yield request.node.name
+    EVENTS.append(["teardown", request.node.name])
+
+
+@pytest.fixture(scope="session", autouse=True)
+def events(worker_id):
+    yield
+    with open(f"events-{worker_id}.json", "w") as f:
+        json.dump(EVENTS, f)
+"""
+
+INNER_TESTS = """
+import asyncio
+import os
+import time
+
+import allure
+import pytest
+
+STARTED = time.monotonic()
+
+
+@pytest.mark.asyncio(loop_scope="class")
+class TestBatch:
+    @pytest.mark.concurrent
+    @pytest.mark.parametrize("i", range(4))
+    async def test_member(self, per_test, i):
+        assert per_test == f"test_member[{i}]"
+        with allure.step(f"step {i}"):
+            await asyncio.sleep(0.5)
+        allure.attach(str(i), name=f"attachment {i}")
+        assert i != 2, "boom"
+
+    async def test_after(self):
+        # 串行执行 4 x 0.5s 的测试至少需要 2s
+        if os.environ.get("EXPECT_CONCURRENT"):
+            assert time.monotonic() - STARTED < 1.5
+"""
+
+
+def _events(pytester):
+    events = []
+    for file in sorted(pytester.path.glob("events-*.json")):
+        events.extend(json.loads(file.read_text()))
+    return events
+
+
+def _allure_results(pytester):
+    results = {}
+    for file in (pytester.path / "allure").glob("*-result.json"):
+        result = json.loads(file.read_text())
+        results[result["name"]] = result
+    return results
+
+
+@pytest.mark.parametrize("workers", ["0", "2"])
+def test_concurrent_class(pytester, project_path, monkeypatch, workers):
+    """concurrent 测试并发执行，报告、fixture 和 allure 结果与串行执行一致；xdist 下不分批，逐个执行"""
+    concurrent = workers == "0"
+    if concurrent:
+        monkeypatch.setenv("EXPECT_CONCURRENT", "1")
+    pytester.makeini("""
+        [pytest]
+        asyncio_mode = auto
+        asyncio_default_fixture_loop_scope = session
+        markers = concurrent
+    """)
+    pytester.makeconftest(INNER_CONFTEST)
+    pytester.makepyfile(test_inner=INNER_TESTS)
+
+    # loadscope 把整个类分配给同一个 worker
+    result = pytester.runpytest_subprocess("-n", workers, "--dist", "loadscope", "-p", "no:cacheprovider",
+                                           "--alluredir", str(pytester.path / "allure"))
+    result.assert_outcomes(passed=4, failed=1)
+
+    members = [f"test_member[{i}]" for i in range(4)]
+    events = [event for event in _events(pytester) if event[1] in members]
+    outcome = {name: "passed" for name in members} | {"test_member[2]": "failed"}
+    if concurrent:
+        # 批次内逐个 setup，并发执行后按收集顺序逐个上报调用结果并 teardown
+        assert [event for event in events if event[0] != "report"] == (
+            [["setup", name] for name in members] + [["teardown", name] for name in members])
+        assert [event[1:] for event in events if event[0] == "report"] == (
+            [[name, "setup", "passed"] for name in members]
+            + [[name, when, outcome[name] if when == "call" else "passed"]
+               for name in members for when in ("call", "teardown")])
+    else:
+        assert events == [
+            event for name in members for event in (
+                ["setup", name], ["report", name, "setup", "passed"],
+                ["report", name, "call", outcome[name]],
+                ["teardown", name], ["report", name, "teardown", "passed"])]
+
+    allure_results = _allure_results(pytester)
+    for i, name in enumerate(members):
+        test_result = allure_results[name]
+        assert test_result["status"] == ("failed" if i == 2 else "passed")
+        assert [step["name"] for step in test_result["steps"]] == [f"step {i}"]
+        assert [attachment["name"] for attachment in test_result.get("attachments", [])] == [f"attachment {i}"]
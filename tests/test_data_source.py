@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from utils.data_source import DataSource, SourceRow
+from utils.template import TemplateContext
+from utils.test_data_index import SourceTable, TestDataIndex
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    rows = [{"case_name": f"case-{i}", "username": f"user-{i}-{{timestamp}}", "code": i} for i in range(200)]
+    data_file = tmp_path / "corpus.jsonl"
+    data_file.write_text("\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n\n", encoding="utf-8")
+    return data_file
+
+
+def test_scan_range_and_id_field(corpus):
+    ids, offsets = DataSource(corpus, id_field="case_name", start=10, stop=15).scan()
+    assert ids == [f"case-{i}" for i in range(10, 15)]
+    assert len(offsets) == 5
+
+    ids, _ = DataSource(corpus, stop=2).scan()
+    assert ids == ["corpus-0", "corpus-1"]
+
+
+def test_subset_is_reproducible_with_seed(corpus):
+    first, _ = DataSource(corpus, id_field="case_name", subset=0.25, seed="s1").scan()
+    second, _ = DataSource(corpus, id_field="case_name", subset=0.25, seed="s1").scan()
+    other, _ = DataSource(corpus, id_field="case_name", subset=0.25, seed="s2").scan()
+    assert first == second
+    assert first != other
+    assert 20 < len(first) < 80
+
+
+def test_source_row_renders_placeholders_when_loaded(corpus):
+    source = DataSource(corpus, id_field="case_name", start=3, stop=4)
+    _, offsets = source.scan()
+    data = SourceRow(source, offsets[0]).load(TemplateContext(1700000000000))
+    assert (data.case_name, data.username, data.code) == ("case-3", "user-3-1700000000000", 3)
+
+
+def test_csv_cells_stay_strings_unless_typed(tmp_path):
+    data_file = tmp_path / "corpus.csv"
+    data_file.write_text('case_name,username,ok,status,msg\nfirst,NaN,false,401,"a, b"\nsecond,1e5,true,-0,null\n',
+                         encoding="utf-8")
+    source = DataSource(data_file, id_field="case_name", types={"ok": "bool", "status": "int"})
+    ids, offsets = source.scan()
+    assert ids == ["first", "second"]
+    first = source.read(offsets[0], TemplateContext(0))
+    second = source.read(offsets[1], TemplateContext(0))
+    assert (first.username, first.ok, first.status, first.msg) == ("NaN", False, 401, "a, b")
+    assert (second.username, second.ok, second.status, second.msg) == ("1e5", True, 0, "null")
+
+    with pytest.raises(ValueError, match="missing"):
+        DataSource(data_file, types={"missing": "int"})
+    with pytest.raises(ValueError, match="decimal"):
+        DataSource(data_file, types={"status": "decimal"})
+
+
+def test_index_subset_follows_test_data_seed(tmp_path, corpus):
+    (tmp_path / "test_data.yaml").write_text(
+        "test_corpus:\n  data_source: corpus.jsonl\n  id_field: case_name\n  subset: 0.25\n", encoding="utf-8")
+
+    def build(ts, seed):
+        index = TestDataIndex()
+        index.build(tmp_path, ts=ts, seed=seed)
+        table = index.get(tmp_path, "test_corpus")
+        assert isinstance(table, SourceTable)
+        return table.ids
+
+    # 指定种子时不同运行（时间戳）选取相同的子集，未指定时随时间戳变化
+    assert build(1, "seed") == build(2, "seed")
+    assert build(1, None) != build(2, None)
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from utils.scheduling import DurationHistory, load_snapshot, select_shard, split_scope
+
+NODEIDS = [f"testcases/api/test_{m}.py::TestC{c}::test_{t}[{p}]"
+           for m in range(6) for c in range(4) for t in range(3) for p in range(2)]
+NODEIDS += [f"testcases/e2e/test_{m}.py::test_{t}" for m in range(5) for t in range(3)]
+
+
+def _shards(nodeids, history, total):
+    return [select_shard(nodeids, history, index, total) for index in range(1, total + 1)]
+
+
+@pytest.mark.parametrize("total", [1, 2, 3, 7, 40])
+@pytest.mark.parametrize("with_history", [True, False])
+def test_every_nodeid_lands_in_exactly_one_shard(total, with_history):
+    rng = random.Random(total)
+    # 部分测试有历史记录
+    history = {nodeid: rng.uniform(0.1, 5) for nodeid in NODEIDS if rng.random() < 0.7} if with_history else {}
+    shards = _shards(NODEIDS, history, total)
+    for nodeid in NODEIDS:
+        assert sum(split_scope(nodeid) in shard for shard in shards) == 1, nodeid
+
+
+def test_partition_is_independent_of_collection_order():
+    shuffled = NODEIDS[:]
+    random.Random(0).shuffle(shuffled)
+    history = {nodeid: float(i % 7) for i, nodeid in enumerate(NODEIDS)}
+    assert _shards(NODEIDS, history, 3) == _shards(shuffled, history, 3)
+    assert _shards(NODEIDS, {}, 3) == _shards(shuffled, {}, 3)
+
+
+def test_exported_snapshot_gives_the_same_partition(tmp_path):
+    history = DurationHistory(tmp_path / "durations.sqlite3")
+    history.record({nodeid: float(i % 5) + 0.5 for i, nodeid in enumerate(NODEIDS)})
+    history.export(tmp_path / "durations.json")
+
+    snapshot = load_snapshot(tmp_path / "durations.json")
+    assert _shards(NODEIDS, snapshot, 4) == _shards(NODEIDS, history.load(), 4)
+    assert load_snapshot(tmp_path / "missing.json") == {}
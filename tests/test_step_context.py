@@ -0,0 +1,98 @@
+import json
+
+INNER_CONFTEST = """
+import allure
+import allure_commons
+import pytest
+from allure_commons._core import plugin_manager
+
+from utils.step_context import flush_steps
+
+STARTED = []
+
+
+class Listener:
+    @allure_commons.hookimpl
+    def start_step(self, uuid, title, params):
+        STARTED.append(title)
+
+
+plugin_manager.register(Listener())
+
+
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_fixture_setup(fixturedef, request):
+    yield
+    flush_steps()
+
+
+def pytest_runtest_logfinish(nodeid, location):
+    flush_steps()
+
+
+def pytest_fixture_post_finalizer(fixturedef, request):
+    flush_steps()
+
+
+def pytest_sessionfinish(session):
+    with open("started.json", "w") as f:
+        json.dump(STARTED, f)
+
+
+@pytest.fixture
+def resource():
+    with allure.step("setup step"):
+        pass
+    yield
+    with allure.step("teardown step"):
+        allure.attach("teardown", name="teardown attachment")
+"""
+
+INNER_TESTS = """
+import allure
+import pytest
+
+
+@allure.step("keyword {x}")
+def keyword(x):
+    with allure.step("inner"):
+        allure.attach(str(x), name="inner attachment")
+
+
+def test_steps(resource):
+    keyword(1)
+    with pytest.raises(ZeroDivisionError):
+        with allure.step("broken"):
+            1 / 0
+"""
+
+
+def _steps(steps):
+    return [(step["name"], step["status"], [a["name"] for a in step.get("attachments", [])],
+             _steps(step.get("steps", []))) for step in steps]
+
+
+def test_buffered_steps_are_replayed_through_allure_hooks(pytester, project_path):
+    """缓冲的步骤经 allure 插件钩子写入测试和 fixture 结果，其他监听器同样收到"""
+    pytester.makeconftest("import json\n" + INNER_CONFTEST)
+    pytester.makepyfile(test_inner=INNER_TESTS)
+    allure_dir = pytester.path / "allure"
+    pytester.runpytest_subprocess("-p", "no:cacheprovider", "--alluredir", str(allure_dir)).assert_outcomes(passed=1)
+
+    assert json.loads((pytester.path / "started.json").read_text()) == [
+        "setup step", "keyword 1", "inner", "broken", "teardown step"]
+
+    [result] = [json.loads(file.read_text()) for file in allure_dir.glob("*-result.json")]
+    assert _steps(result["steps"]) == [
+        ("keyword 1", "passed", [], [("inner", "passed", ["inner attachment"], [])]),
+        ("broken", "broken", [], []),
+    ]
+    assert all(step["start"] <= step["stop"] <= result["stop"] for step in result["steps"])
+
+    fixtures = {}
+    for file in allure_dir.glob("*-container.json"):
+        container = json.loads(file.read_text())
+        for fixture in container.get("befores", []) + container.get("afters", []):
+            fixtures[fixture["name"]] = _steps(fixture.get("steps", []))
+    assert fixtures["resource"] == [("setup step", "passed", [], [])]
+    assert fixtures["resource::0"] == [("teardown step", "passed", ["teardown attachment"], [])]
@@ -1,7 +1,10 @@
 from utils.test_data_manage import DataCache, TestData, test_data
+from utils.test_data_index import TestDataIndex, test_data_index
 from utils.env_manage import env
 from utils._utils import timestamp, json_dumps, dict_to_csv
 from utils.step_context import StepContext
-from utils.artifacts_recorder import ArtifactsRecorder
+from utils.attachment_store import AttachmentStore, attachment_store
+from utils.allure_writer import AllureWriter, allure_writer
+from utils.artifacts_recorder import ArtifactsRecorder, ArtifactFinalizer, artifact_finalizer
 
 rootdir: str
@@ -0,0 +1,189 @@
+import atexit
+import errno
+import logging
+import os
+import queue
+import threading
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+from allure_commons import hookimpl
+from allure_commons.logger import AllureFileLogger
+
+logger = logging.getLogger(__name__)
+
+_report_result = AllureFileLogger.report_result
+_report_container = AllureFileLogger.report_container
+_report_attached_data = AllureFileLogger.report_attached_data
+_report_attached_file = AllureFileLogger.report_attached_file
+
+
+class AllureWriter:
+    """
+    allure 结果和附件的后台写入队列
+
+    AllureFileLogger 的结果、容器和附件写入放入有界队列，由后台线程批量取出执行，测试线程（事件循环）不再等待文件 I/O；
+    队列满时写入方阻塞等待（背压），避免内存无限增长。flush 等待队列清空，会话结束和进程退出时自动调用。
+    附件任务（submit_attachment）可能在执行时才确定附件文件名，之后提交的结果和容器写入会等待之前的附件任务完成。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.batch_size = 32
+        self._queue: Optional[queue.Queue] = None
+        self._threads: List[threading.Thread] = []
+        # writes: 完成的写入数，batches: 批次数，errors: 写入失败数，max_depth: 最大队列深度，
+        # blocked: 写入方因队列满等待的秒数
+        self.stats: Dict[str, float] = {"writes": 0, "batches": 0, "errors": 0, "max_depth": 0, "blocked": 0.0}
+        self._lock = threading.Lock()
+        # 附件任务的序号和未完成的序号，队列先进先出，结果写入只等待先于它取出的附件任务，不会死锁
+        self._attachment_seq = 0
+        self._unfinished_attachments: set[int] = set()
+        self._attachments_done = threading.Condition(self._lock)
+
+    @property
+    def depth(self) -> int:
+        """当前未完成（排队和正在执行）的写入数"""
+        return self._queue.unfinished_tasks if self._queue else 0
+
+    @property
+    def capacity(self) -> int:
+        return self._queue.maxsize if self._queue else 0
+
+    def start(self, threads: int, max_queue: int) -> None:
+        """
+        启动后台写入线程
+
+        :param threads: 线程数，0 时同步写入
+        :param max_queue: 队列容量
+        """
+        if threads <= 0 or self.enabled:
+            return
+        self._queue = queue.Queue(maxsize=max_queue)
+        for i in range(threads):
+            thread = threading.Thread(target=self._worker, name=f"allure-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.enabled = True
+        atexit.register(self.flush)
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> None:
+        """加入一个写入任务，未启动时直接执行"""
+        if not self.enabled:
+            func(*args)
+            return
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put((func, args))
+            with self._lock:
+                self.stats["blocked"] += time.perf_counter() - start
+        depth = self._queue.unfinished_tasks
+        if depth > self.stats["max_depth"]:
+            self.stats["max_depth"] = depth
+
+    def submit_attachment(self, func: Callable[..., Any], *args: Any) -> None:
+        """加入一个附件任务，之后提交的结果和容器写入在它完成后才执行"""
+        if not self.enabled:
+            func(*args)
+            return
+        with self._lock:
+            seq = self._attachment_seq
+            self._attachment_seq += 1
+            self._unfinished_attachments.add(seq)
+        self.submit(self._run_attachment, seq, func, args)
+
+    def submit_after_attachments(self, func: Callable[..., Any], *args: Any) -> None:
+        """加入一个写入任务，执行前等待已提交的附件任务完成"""
+        self.submit(self._run_after_attachments, self._attachment_seq, func, args)
+
+    def _run_attachment(self, seq: int, func: Callable[..., Any], args: tuple) -> None:
+        try:
+            func(*args)
+        finally:
+            with self._attachments_done:
+                self._unfinished_attachments.discard(seq)
+                self._attachments_done.notify_all()
+
+    def _run_after_attachments(self, seq: int, func: Callable[..., Any], args: tuple) -> None:
+        with self._attachments_done:
+            self._attachments_done.wait_for(lambda: all(s >= seq for s in self._unfinished_attachments))
+        func(*args)
+
+    def flush(self) -> None:
+        """等待队列中的写入全部完成"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def _worker(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            errors = 0
+            for func, args in batch:
+                try:
+                    func(*args)
+                except Exception:
+                    errors += 1
+                    logger.exception("allure 结果写入失败")
+                finally:
+                    self._queue.task_done()
+            with self._lock:
+                self.stats["writes"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["errors"] += errors
+
+    def merge(self, stats: Dict[str, float]) -> None:
+        """合并其他进程（xdist worker）的统计"""
+        for key, value in stats.items():
+            if key == "max_depth":
+                self.stats[key] = max(self.stats[key], value)
+            else:
+                self.stats[key] += value
+
+
+allure_writer = AllureWriter()
+
+
+@hookimpl
+def _background_report_result(self: AllureFileLogger, result) -> None:
+    allure_writer.submit_after_attachments(_report_result, self, result)
+
+
+@hookimpl
+def _background_report_container(self: AllureFileLogger, container) -> None:
+    allure_writer.submit_after_attachments(_report_container, self, container)
+
+
+@hookimpl
+def _background_report_attached_data(self: AllureFileLogger, body, file_name) -> None:
+    allure_writer.submit(_report_attached_data, self, body, file_name)
+
+
+@hookimpl
+def _background_report_attached_file(self: AllureFileLogger, source, file_name) -> None:
+    """
+    附件文件优先硬链接到结果目录（调用方随后删除源文件也不影响），不在同一文件系统时同步复制
+    """
+    if not allure_writer.enabled:
+        return _report_attached_file(self, source, file_name)
+    try:
+        os.link(source, self._report_dir / file_name)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        _report_attached_file(self, source, file_name)
+
+
+AllureFileLogger.report_result = _background_report_result
+AllureFileLogger.report_container = _background_report_container
+AllureFileLogger.report_attached_data = _background_report_attached_data
+AllureFileLogger.report_attached_file = _background_report_attached_file
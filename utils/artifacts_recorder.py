@@ -1,25 +1,43 @@
 import asyncio
 import allure
 import hashlib
+import io
+import logging
 import shutil
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import (
     Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
     List,
+    Optional,
+    Set,
+    Tuple,
 )
 
 import pytest
+from allure_commons.utils import uuid4
 from playwright.async_api import (
     BrowserContext,
     Error,
     Page,
     Playwright,
+    Video,
 )
 from slugify import slugify
 import tempfile
 import pytest_playwright_asyncio
 
+from utils.attachment_store import attachment_store
+from utils.step_context import current_reporter
+
+logger = logging.getLogger(__name__)
+
 
 class ArtifactsRecorder:
     def __init__(
@@ -37,7 +55,12 @@ class ArtifactsRecorder:
         self._pw_artifacts_folder = pw_artifacts_folder
 
         self._all_pages: List[Page] = []
-        self._screenshots: List[str] = []
+        # 每个页面最近的截图（环形缓冲区），测试失败时才处理和保存
+        self._screenshots: Dict[Page, Deque[bytes]] = {}
+        self._capture_tasks: Set[asyncio.Future] = set()
+        self._screenshot_option = pytestconfig.getoption("--screenshot")
+        self._screenshot_buffer = max(pytestconfig.getoption("--screenshot-buffer"), 1)
+        self._screenshot_type = pytestconfig.getoption("--screenshot-type")
         self._traces: List[str] = []
         self._tracing_option = pytestconfig.getoption("--tracing")
         self._capture_trace = self._tracing_option in [
@@ -50,27 +73,23 @@ class ArtifactsRecorder:
         )
 
     async def did_finish_test(self, failed: bool) -> None:
-        screenshot_option = self._pytestconfig.getoption("--screenshot")
-        capture_screenshot = screenshot_option == "on" or (
-            failed and screenshot_option == "only-on-failure"
+        capture_screenshot = self._screenshot_option == "on" or (
+            failed and self._screenshot_option == "only-on-failure"
         )
+        jobs = []
         if capture_screenshot:
-            for index, screenshot in enumerate(self._screenshots):
-                human_readable_status = "failed" if failed else "finished"
-                screenshot_name = f"test-{human_readable_status}-{index + 1}.png"
-                screenshot_path = self._build_artifact_test_folder(
-                    screenshot_name,
-                )
-                # os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
-                # shutil.move(screenshot, screenshot_path)
-                allure.attach.file(
-                    screenshot_path,
-                    name=screenshot_name,
-                    attachment_type=allure.attachment_type.PNG,
-                )
-        else:
-            for screenshot in self._screenshots:
-                os.remove(screenshot)
+            human_readable_status = "failed" if failed else "finished"
+            screenshots = [screenshot for ring in self._screenshots.values() for screenshot in ring]
+            job = self._persist_screenshots([
+                (screenshot, f"test-{human_readable_status}-{index + 1}.{self._screenshot_type}")
+                for index, screenshot in enumerate(screenshots)
+            ])
+            if artifact_finalizer.background:
+                # 截图已在内存中，只需缩小，在当前 fixture 中附加，与其他附件一样按内容去重
+                await job
+            else:
+                jobs.append(job)
+        self._screenshots.clear()
 
         if self._tracing_option == "on" or (
             failed and self._tracing_option == "retain-on-failure"
@@ -81,11 +100,10 @@ class ArtifactsRecorder:
                         self._traces) == 1 else f"trace-{index + 1}.zip"
                 )
                 trace_path = self._build_artifact_test_folder(trace_file_name)
-                os.makedirs(os.path.dirname(trace_path), exist_ok=True)
-                shutil.move(trace, trace_path)
+                jobs.append(artifact_finalizer.run(_move_file, trace, trace_path))
         else:
             for trace in self._traces:
-                os.remove(trace)
+                jobs.append(artifact_finalizer.run(os.remove, trace))
 
         video_option = self._pytestconfig.getoption("--video")
         preserve_video = video_option == "on" or (
@@ -96,37 +114,90 @@ class ArtifactsRecorder:
                 video = page.video
                 if not video:
                     continue
-                try:
-                    video_file_name = (
-                        "video.webm"
-                        if len(self._all_pages) == 1
-                        else f"video-{index + 1}.webm"
-                    )
-                    path = self._build_artifact_test_folder(video_file_name)
-                    await video.save_as(
-                        path=path
-                    )
-                    # with open(path, "rb") as f:
-                    allure.attach(path, name=video_file_name,
-                                  attachment_type=allure.attachment_type.WEBM)
-                    await asyncio.sleep(5)
-                    await page.video.delete()
-                except Error as e:
-                    # Silent catch empty videos.
-
-                    pytest.fail(f"Error while saving video: {e}")
-        else:
+                video_file_name = (
+                    "video.webm"
+                    if len(self._all_pages) == 1
+                    else f"video-{index + 1}.webm"
+                )
+                # 后台收尾时测试结果可能先于视频写出，附件需在当前 fixture 中预先登记，文件名不是内容哈希，视频不去重
+                reserved = _reserve_attachment(video_file_name, allure.attachment_type.WEBM) \
+                    if artifact_finalizer.background else None
+                jobs.append(self._finalize_video(video, video_file_name, reserved))
+        elif video_option in ["on", "retain-on-failure"]:
             for page in self._all_pages:
                 # Can be changed to "if page.video" without try/except once https://github.com/microsoft/playwright-python/pull/2410 is released and widely adopted.
-                if video_option in ["on", "retain-on-failure"]:
-                    try:
-                        if page.video:
-                            await page.video.delete()
-                    except Error:
-                        pass
+                jobs.append(_delete_video(page))
+
+        if artifact_finalizer.background:
+            # 逐个提交，某个任务失败时其余任务仍由 drain 等待
+            for job in jobs:
+                artifact_finalizer.submit(job)
+            return
+        errors = [e for e in await asyncio.gather(*jobs, return_exceptions=True) if isinstance(e, BaseException)]
+        for error in errors:
+            if not isinstance(error, Error):
+                raise error
+        if errors:
+            # Silent catch empty videos.
+            pytest.fail(f"Error while saving video: {errors[0]}")
+
+    async def _finalize_video(self, video: Video, file_name: str, reserved: Optional[str]) -> None:
+        """
+        保存并附加视频，save_as 在页面关闭、视频写完后返回，无需固定等待
+        """
+        path = self._build_artifact_test_folder(file_name)
+        await video.save_as(path=path)
+        await video.delete()
+        if reserved:
+            await artifact_finalizer.run(attachment_store.write_reserved, path, reserved)
+        else:
+            body = await artifact_finalizer.run(Path(path).read_bytes)
+            allure.attach(body, name=file_name, attachment_type=allure.attachment_type.WEBM)
+
+    async def _persist_screenshots(self, screenshots: List[Tuple[bytes, str]]) -> None:
+        """按 --screenshot-max-width 并发缩小截图后按顺序附加到报告"""
+        max_width = self._pytestconfig.getoption("--screenshot-max-width")
+        bodies = [screenshot for screenshot, _ in screenshots]
+        if max_width > 0:
+            bodies = await asyncio.gather(*(artifact_finalizer.run(_downscale, body, max_width) for body in bodies))
+        for body, (_, file_name) in zip(bodies, screenshots):
+            allure.attach(body, name=file_name, attachment_type=_SCREENSHOT_TYPES[self._screenshot_type])
+
+    def _on_page(self, page: Page) -> None:
+        self._all_pages.append(page)
+        if self._screenshot_option != "off" and self._screenshot_buffer > 1:
+            # 页面每次加载完成时截图，失败时可以看到最近的几个页面
+            # 只截取视口：整页截图会临时修改 Chromium 的设备尺寸，测试进行中截取会干扰页面
+            page.on("load", self._schedule_capture)
+
+    def _schedule_capture(self, page: Page) -> None:
+        task = asyncio.ensure_future(self._capture(page))
+        self._capture_tasks.add(task)
+        task.add_done_callback(self._capture_tasks.discard)
+
+    async def _capture(self, page: Page, full_page: bool = False) -> None:
+        """截图放入页面的环形缓冲区，只保留最近 --screenshot-buffer 张"""
+        try:
+            screenshot = await page.screenshot(
+                timeout=5000,
+                full_page=full_page,
+                type=self._screenshot_type,
+                scale="css",
+            )
+        except Error:
+            return
+        ring = self._screenshots.get(page)
+        if ring is None:
+            ring = self._screenshots[page] = deque(maxlen=self._screenshot_buffer)
+        ring.append(screenshot)
+
+    def _test_failed(self) -> bool:
+        """关闭上下文时测试是否已失败，测试函数执行中关闭时按失败处理"""
+        report = getattr(self._request.node, "rep_call", None) if self._request else None
+        return report is None or report.failed
 
     async def on_did_create_browser_context(self, context: BrowserContext) -> None:
-        context.on("page", lambda page: self._all_pages.append(page))
+        context.on("page", self._on_page)
         if self._request and self._capture_trace:
             await context.tracing.start(
                 title=slugify(self._request.node.nodeid),
@@ -143,29 +214,116 @@ class ArtifactsRecorder:
         else:
             await context.tracing.stop()
 
-        if self._pytestconfig.getoption("--screenshot") in ["on", "only-on-failure"]:
-            for page in context.pages:
-                try:
-                    screenshot_path = (
-                        Path(self._pw_artifacts_folder.name) / _create_guid()
-                    )
-                    screenshot = await page.screenshot(
-                        timeout=5000,
-                        full_page=self._pytestconfig.getoption(
-                            "--full-page-screenshot"
-                        ),
-                    )
-                    allure.attach(screenshot, name=screenshot_path.stem,
-                                  attachment_type=allure.attachment_type.PNG)
-
-                    self._screenshots.append(str(screenshot_path))
-                except Error:
-                    pass
+        if self._capture_tasks:
+            await asyncio.gather(*self._capture_tasks, return_exceptions=True)
+        # only-on-failure 时测试通过则不截图
+        if self._screenshot_option == "on" or (
+            self._screenshot_option == "only-on-failure" and self._test_failed()
+        ):
+            full_page = self._pytestconfig.getoption("--full-page-screenshot")
+            await asyncio.gather(*(self._capture(page, full_page) for page in context.pages))
+
+
+class ArtifactFinalizer:
+    """
+    测试产物（trace、视频）的收尾
+
+    文件的移动、读取和删除在线程池中执行，多个页面的视频并发保存；
+    background 为 True 时收尾任务在 session 事件循环中后台执行，下一个测试无需等待，会话结束前由 drain 等待全部完成，
+    任务失败时 drain 使会话 fixture 的 teardown 报错。
+    """
 
+    def __init__(self):
+        self.background = False
+        self.max_workers = 4
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set[asyncio.Future] = set()
+        self._errors: List[BaseException] = []
+
+    @property
+    def pending(self) -> int:
+        """未完成的后台收尾任务数"""
+        return len(self._tasks)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行文件操作"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="artifacts")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def submit(self, awaitable: Awaitable[Any]) -> None:
+        """加入后台收尾任务"""
+        task = asyncio.ensure_future(awaitable)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"测试产物收尾失败: {task.exception()!r}")
+            self._errors.append(task.exception())
+
+    async def drain(self) -> None:
+        """等待全部后台收尾任务完成，有任务失败时调用 pytest.fail"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        errors, self._errors = self._errors, []
+        if errors:
+            pytest.fail(f"{len(errors)} 个测试产物收尾失败: " + "; ".join(repr(error) for error in errors))
+
+
+artifact_finalizer = ArtifactFinalizer()
 
 pytest_playwright_asyncio.ArtifactsRecorder = ArtifactsRecorder
 
 
+_SCREENSHOT_TYPES = {
+    "png": allure.attachment_type.PNG,
+    "jpeg": allure.attachment_type.JPG,
+}
+
+
+def _downscale(screenshot: bytes, max_width: int) -> bytes:
+    """宽度超过 max_width 的截图等比缩小后按原格式重新编码（需要安装 Pillow）"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(screenshot)) as image:
+        if image.width <= max_width:
+            return screenshot
+        image_format = image.format
+        image.thumbnail((max_width, image.height * max_width // image.width))
+        output = io.BytesIO()
+        if image_format == "JPEG":
+            image.save(output, format=image_format, quality=80)
+        else:
+            image.save(output, format=image_format, optimize=True)
+        return output.getvalue()
+
+
+def _move_file(source: str, destination: str) -> None:
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.move(source, destination)
+
+
+async def _delete_video(page: Page) -> None:
+    try:
+        if page.video:
+            await page.video.delete()
+    except Error:
+        pass
+
+
+def _reserve_attachment(name: str, attachment_type: Any) -> Optional[str]:
+    """在当前测试或 fixture 中登记附件，返回附件文件名，文件稍后写入"""
+    reporter = current_reporter()
+    if reporter is None:
+        return None
+    return reporter._attach(uuid4(), name=name, attachment_type=attachment_type)
+
+
 def _create_guid() -> str:
     return hashlib.sha256(os.urandom(16)).hexdigest()
 
@@ -2,7 +2,7 @@ import allure
 
 from core import ResultBase, ContentType
 from utils.test_data_manage import TestData
-from utils.extensions import JSONSchemaSnapshotExtension
+from utils.extensions import schema_extension
 from syrupy import SnapshotAssertion
 
 
@@ -39,6 +39,9 @@ def assert_result(result: ResultBase, expect: TestData, snapshot: SnapshotAssert
         content, content_type = result.content()
         # schema_name = schema_name if schema_name is not None else f"content.{content_type}"
         if content_type == ContentType.json_type:
-            assert content == snapshot.use_extension(JSONSchemaSnapshotExtension)
+            # 直接传入已解析的对象，由扩展跳过反序列化
+            data = result.json()
+            data = data if isinstance(data, (dict, list)) else content
+            assert data == snapshot.use_extension(schema_extension())
         elif content:
             assert content == snapshot
@@ -0,0 +1,164 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from allure_commons._core import plugin_manager
+from allure_commons.model2 import Attachment, ATTACHMENT_PATTERN
+from allure_commons.reporter import AllureReporter
+from allure_commons.types import AttachmentType
+from allure_commons.utils import uuid4
+
+from utils.allure_writer import allure_writer
+
+logger = logging.getLogger(__name__)
+
+# 可以压缩的文本类型
+_TEXT_TYPES = ("text/", "application/json", "application/xml", "application/yaml", "image/svg+xml")
+
+_attach_data = AllureReporter.attach_data
+_attach_file = AllureReporter.attach_file
+
+
+def _mime_and_extension(attachment_type: Any, extension: Optional[str]) -> Tuple[Optional[str], str]:
+    if type(attachment_type) is AttachmentType:
+        return attachment_type.mime_type, attachment_type.extension
+    return attachment_type, extension or "attach"
+
+
+class AttachmentStore:
+    """
+    按内容寻址的 allure 附件存储
+
+    附件文件名为内容哈希（<blake2b>-attachment.<ext>），相同内容的附件只写入一次，后续附件直接引用已有文件。
+    xdist 下各 worker 写入同一个结果目录，已存在的文件同样跳过。
+    compress_threshold 大于 0 时，超过该大小的文本附件以 gzip 压缩保存（类型为 application/gzip，报告中需下载查看）。
+    后台写入开启时，附件文件先硬链接到结果目录，由写入线程计算哈希，事件循环不读取文件内容。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.report_dir: Optional[Path] = None
+        self.compress_threshold = 0
+        self._stored: set[str] = set()
+        self._lock = threading.Lock()
+        # stored: 写入的附件数，deduplicated: 复用已有文件的附件数，saved_bytes: 去重和压缩节省的字节数
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def digest(body: bytes) -> str:
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    @staticmethod
+    def file_digest(source: str | os.PathLike) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def prepare(self, body: str | bytes, attachment_type: Any, extension: Optional[str]) -> Tuple[bytes, str, Any, str]:
+        """
+        计算附件内容的哈希，需要时压缩
+
+        :return: 写入的内容、哈希、附件类型和扩展名
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        digest = self.digest(body)
+        mime_type, ext = _mime_and_extension(attachment_type, extension)
+        if (0 < self.compress_threshold <= len(body)
+                and mime_type and mime_type.startswith(_TEXT_TYPES)):
+            compressed = gzip.compress(body, mtime=0)
+            self.stats["saved_bytes"] += len(body) - len(compressed)
+            return compressed, digest, "application/gzip", f"{ext}.gz"
+        return body, digest, attachment_type, extension
+
+    def claim(self, file_name: str, size: int) -> bool:
+        """附件文件是否需要写入，已写入或结果目录中已存在时返回 False"""
+        with self._lock:
+            if file_name in self._stored or (self.report_dir and (self.report_dir / file_name).exists()):
+                self._stored.add(file_name)
+                self.stats["deduplicated"] += 1
+                self.stats["saved_bytes"] += size
+                return False
+            self._stored.add(file_name)
+            self.stats["stored"] += 1
+            return True
+
+    def stage(self, source: str | os.PathLike) -> Optional[Path]:
+        """
+        把附件文件硬链接到结果目录下的临时文件，调用方随后删除源文件也不影响
+
+        :return: 临时文件路径，无结果目录或不能硬链接（如不在同一文件系统）时返回 None
+        """
+        if self.report_dir is None:
+            return None
+        staged = self.report_dir / f"{uuid4()}-staging.tmp"
+        try:
+            os.link(source, staged)
+        except OSError:
+            return None
+        return staged
+
+    def write_reserved(self, source: str | os.PathLike, file_name: str) -> None:
+        """
+        写入预先以 uuid 文件名登记的附件（后台收尾的视频）
+
+        测试结果先于文件内容写出，文件名无法改为内容哈希，不去重，只计入统计
+        """
+        if self.enabled:
+            self.claim(file_name, os.path.getsize(source))
+        plugin_manager.hook.report_attached_file(source=source, file_name=file_name)
+
+    def settle(self, attachment: Attachment, staged: Path, extension: str) -> None:
+        """在写入线程中计算临时文件的哈希，按内容哈希命名（已存在时删除临时文件），并更新附件引用的文件名"""
+        file_name = ATTACHMENT_PATTERN.format(prefix=self.file_digest(staged), ext=extension)
+        if self.claim(file_name, os.path.getsize(staged)):
+            os.replace(staged, self.report_dir / file_name)
+        else:
+            os.remove(staged)
+        attachment.source = file_name
+
+
+attachment_store = AttachmentStore()
+
+
+def _store_attach_data(self: AllureReporter, uuid, body, name=None, attachment_type=None, extension=None,
+                       parent_uuid=None):
+    if not attachment_store.enabled:
+        return _attach_data(self, uuid, body, name=name, attachment_type=attachment_type, extension=extension,
+                            parent_uuid=parent_uuid)
+    body, digest, attachment_type, extension = attachment_store.prepare(body, attachment_type, extension)
+    file_name = self._attach(digest, name=name, attachment_type=attachment_type, extension=extension,
+                             parent_uuid=parent_uuid)
+    if attachment_store.claim(file_name, len(body)):
+        plugin_manager.hook.report_attached_data(body=body, file_name=file_name)
+
+
+def _store_attach_file(self: AllureReporter, uuid, source, name=None, attachment_type=None, extension=None,
+                       parent_uuid=None):
+    if not attachment_store.enabled:
+        return _attach_file(self, uuid, source, name=name, attachment_type=attachment_type, extension=extension,
+                            parent_uuid=parent_uuid)
+    staged = attachment_store.stage(source) if allure_writer.enabled else None
+    if staged is None:
+        file_name = self._attach(attachment_store.file_digest(source), name=name, attachment_type=attachment_type,
+                                 extension=extension, parent_uuid=parent_uuid)
+        if attachment_store.claim(file_name, os.path.getsize(source)):
+            plugin_manager.hook.report_attached_file(source=source, file_name=file_name)
+        return
+    # 先以 uuid 文件名登记附件，哈希在写入线程中计算，之后提交的结果写入会等待它完成
+    self._attach(uuid, name=name, attachment_type=attachment_type, extension=extension, parent_uuid=parent_uuid)
+    attachment = self._items[parent_uuid or self._last_executable()].attachments[-1]
+    allure_writer.submit_attachment(attachment_store.settle, attachment, staged,
+                                    _mime_and_extension(attachment_type, extension)[1])
+
+
+AllureReporter.attach_data = _store_attach_data
+AllureReporter.attach_file = _store_attach_file
@@ -0,0 +1,338 @@
+import asyncio
+import importlib.metadata
+import inspect
+import logging
+import time
+import warnings
+
+from contextvars import ContextVar
+from typing import Optional, Dict, List
+
+import pytest
+from _pytest.runner import call_and_report
+
+from core.cassette import current_test
+from core.rest_client import RequestLog, request_log
+from utils.step_context import current_executable
+
+logger = logging.getLogger(__name__)
+
+# 每批并发执行的最大测试数，0 表示关闭，由 conftest 根据 --async-concurrency 设置
+concurrency_limit = 0
+
+# 批次执行依赖以下插件的内部实现，仅在这些版本上验证过：
+# pytest 的 SetupState.stack 和 FixtureDef._finalizers，allure 监听器的 _cache。升级这些依赖后需重新运行 tests/test_concurrent_runner.py 并更新此处
+VALIDATED_VERSIONS = {
+    "pytest": "8.3.4",
+    "allure-pytest": "2.13.5",
+    "allure-python-commons": "2.13.5",
+}
+
+# 并发阶段当前任务的日志缓冲区
+_log_buffer: ContextVar[Optional[list]] = ContextVar("concurrent_log_buffer", default=None)
+
+
+def _dispatch(record: logging.LogRecord, handlers: List[logging.Handler]) -> None:
+    for handler in handlers:
+        if record.levelno >= handler.level:
+            handler.handle(record)
+
+
+class _TaskLogHandler(logging.Handler):
+    """
+    并发阶段替换 root logger 的处理器：测试任务内的日志暂存到该测试的缓冲区，在其调用阶段回放，其余日志直接转发
+    """
+
+    def __init__(self, targets: List[logging.Handler]):
+        super().__init__()
+        self.targets = targets
+
+    def emit(self, record: logging.LogRecord) -> None:
+        buffer = _log_buffer.get()
+        if buffer is not None:
+            buffer.append(record)
+        else:
+            _dispatch(record, self.targets)
+
+
+class _Member:
+    """
+    批次中的一个测试及其并发执行结果
+    """
+
+    def __init__(self, item: pytest.Item):
+        self.item = item
+        self.setup_passed = False
+        self.stack_entry = None
+        self.fixture_state: list = []
+        self.error: Optional[BaseException] = None
+        self.start = 0.0
+        self.stop = 0.0
+        self.logs: List[logging.LogRecord] = []
+        self.request_log = RequestLog()
+
+
+class _ItemSource:
+    """
+    按 session.items 的顺序提供测试，批次可以提前取出后续的测试
+
+    xdist worker 中的测试由 xdist 的测试循环逐个下发，不分批：提前取出后续测试需要提前向主进程报告完成，
+    worker 崩溃时这些测试不会被报告或重新调度，耗时也无法统计
+    """
+
+    def __init__(self, items: List[pytest.Item]):
+        self.items = items
+        self.pos = 0
+
+    def pull(self) -> Optional[pytest.Item]:
+        """把下一个测试并入当前批次，返回新的下一个测试"""
+        self.pos += 1
+        return self.items[self.pos + 1] if self.pos + 1 < len(self.items) else None
+
+
+_source: Optional[_ItemSource] = None
+_batch: Optional["_Batch"] = None
+# 已并发执行、等待在调用阶段回放结果的测试
+_pending: Dict[pytest.Item, _Member] = {}
+# 等待修正报告耗时的测试
+_timings: Dict[pytest.Item, _Member] = {}
+
+
+def check_versions() -> List[str]:
+    """返回与 VALIDATED_VERSIONS 不一致的依赖，未安装的可选依赖不计入"""
+    mismatched = []
+    for name, version in VALIDATED_VERSIONS.items():
+        try:
+            installed = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+        if installed != version:
+            mismatched.append(f"{name}=={installed}（已验证 {version}）")
+    return mismatched
+
+
+def is_concurrent(item: pytest.Item) -> bool:
+    """测试是否标记了 concurrent 且为协程函数"""
+    if concurrency_limit <= 0 or item.get_closest_marker("concurrent") is None:
+        return False
+    return inspect.iscoroutinefunction(getattr(item.obj, "_raw_test_func", item.obj))
+
+
+def _limit(item: pytest.Item) -> int:
+    return item.get_closest_marker("concurrent").kwargs.get("limit", concurrency_limit)
+
+
+def runtestloop(session: pytest.Session) -> bool:
+    """
+    与 pytest 默认的测试循环相同，但允许批次提前取出后续的测试
+    """
+    global _source
+    if session.testsfailed and not session.config.option.continue_on_collection_errors:
+        raise session.Interrupted(f"{session.testsfailed} errors during collection")
+    if session.config.option.collectonly:
+        return True
+
+    items = session.items
+    _source = _ItemSource(items)
+    while _source.pos < len(items):
+        item = items[_source.pos]
+        nextitem = items[_source.pos + 1] if _source.pos + 1 < len(items) else None
+        item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+        _source.pos += 1
+        if session.shouldfail:
+            raise session.Failed(session.shouldfail)
+        if session.shouldstop:
+            raise session.Interrupted(session.shouldstop)
+    return True
+
+
+def run_protocol(item: pytest.Item, nextitem: Optional[pytest.Item]) -> Optional[bool]:
+    """
+    执行测试协议，返回 None 时由 pytest 按默认方式执行
+
+    同一个类（或模块）中连续的 concurrent 测试组成批次：逐个完成 setup 后在同一个事件循环中并发执行，
+    再逐个回放调用结果并 teardown。
+    """
+    global _batch
+    if _batch is not None and _batch.expects(item):
+        _batch.run_member()
+        return True
+
+    if _source is None or not is_concurrent(item):
+        return None
+
+    limit = _limit(item)
+    members = [_Member(item)]
+    while (nextitem is not None and len(members) < limit
+           and nextitem.parent is item.parent and is_concurrent(nextitem)):
+        members.append(_Member(nextitem))
+        nextitem = _source.pull()
+    if len(members) == 1:
+        return None
+
+    _batch = _Batch(members, nextitem)
+    try:
+        _batch.run_member()
+    finally:
+        _batch = None
+    return True
+
+
+def replay(item: pytest.Item) -> Optional[bool]:
+    """在测试的调用阶段回放并发执行的日志、请求记录和结果"""
+    member = _pending.pop(item, None)
+    if member is None:
+        return None
+    _timings[item] = member
+    root_handlers = logging.getLogger().handlers
+    for record in member.logs:
+        _dispatch(record, root_handlers)
+    request_log.clear()
+    request_log.extend(member.request_log)
+    if member.error is not None:
+        raise member.error
+    return True
+
+
+def adjust_report(item: pytest.Item, report: pytest.TestReport) -> None:
+    """用并发执行的实际时间修正调用阶段的报告耗时"""
+    member = _timings.pop(item, None)
+    if member is None or report.when != "call":
+        return
+    report.start = member.start
+    report.stop = member.stop
+    report.duration = member.stop - member.start
+
+    listener = item.config.pluginmanager.get_plugin("allure_listener")
+    if listener:
+        test_result = listener.allure_logger.get_test(listener._cache.get(item.nodeid))
+        if test_result:
+            test_result.start = int(member.start * 1000)
+            test_result.stop = int(member.stop * 1000)
+
+
+class _Batch:
+    """
+    并发执行的一批测试
+
+    pytest_runtest_protocol 对每个测试嵌套调用：第 i 个测试 setup 后调用第 i+1 个测试的协议，
+    最内层并发执行全部测试后按批次顺序逐个回放结果并 teardown，此时所有测试的协议（及 allure 等插件的钩子包装）都未退出。
+    """
+
+    def __init__(self, members: List[_Member], nextitem: Optional[pytest.Item]):
+        self.members = members
+        self.nextitem = nextitem
+        self.pos = 0
+
+    def expects(self, item: pytest.Item) -> bool:
+        return self.pos < len(self.members) and self.members[self.pos].item is item
+
+    def run_member(self) -> None:
+        member = self.members[self.pos]
+        item = member.item
+        self.pos += 1
+
+        item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+        if hasattr(item, "_request") and not item._request:
+            item._initrequest()
+        member.setup_passed = call_and_report(item, "setup").passed
+        self._detach(member)
+
+        if self.pos < len(self.members):
+            following = self.members[self.pos].item
+            following.ihook.pytest_runtest_protocol(item=following, nextitem=item)
+        else:
+            self._run_concurrently()
+            self._finish()
+
+    def _finish(self) -> None:
+        """按批次顺序回放调用结果并 teardown，报告顺序与串行执行相同"""
+        for position, member in enumerate(self.members):
+            item = member.item
+            self._attach(member)
+            if member.setup_passed and not item.config.getoption("setuponly", False):
+                _pending[item] = member
+                call_and_report(item, "call")
+
+            if item.session.shouldfail or item.session.shouldstop:
+                nextitem = None
+            elif position + 1 < len(self.members):
+                # 下一个测试的 function 作用域 fixture 已 setup 并暂时移出，只 teardown 当前测试
+                nextitem = self.members[position + 1].item
+            else:
+                nextitem = self.nextitem
+            call_and_report(item, "teardown", nextitem=nextitem)
+            if hasattr(item, "_request"):
+                item._request = False
+                item.funcargs = None
+            item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+
+    @staticmethod
+    def _detach(member: _Member) -> None:
+        """
+        暂时移出测试的 SetupState 节点和 function 作用域 fixture 缓存，
+        使下一个测试可以 setup 自己的 fixture 实例，teardown 前再恢复
+        """
+        item = member.item
+        member.stack_entry = item.session._setupstate.stack.pop(item, None)
+        listener = item.config.pluginmanager.get_plugin("allure_listener")
+        request = getattr(item, "_request", None)
+        for fixturedef in (request._fixture_defs.values() if request else ()):
+            if fixturedef.scope == "function" and fixturedef.cached_result is not None:
+                # allure 按 fixturedef 记录 fixture 所属的容器，每个测试需要各自的容器
+                container_uuid = listener._cache.pop(fixturedef) if listener else None
+                member.fixture_state.append(
+                    (fixturedef, fixturedef.cached_result, list(fixturedef._finalizers), container_uuid))
+                fixturedef.cached_result = None
+                fixturedef._finalizers.clear()
+
+    @staticmethod
+    def _attach(member: _Member) -> None:
+        item = member.item
+        if member.stack_entry is not None:
+            item.session._setupstate.stack[item] = member.stack_entry
+        listener = item.config.pluginmanager.get_plugin("allure_listener")
+        for fixturedef, cached_result, finalizers, container_uuid in member.fixture_state:
+            fixturedef.cached_result = cached_result
+            fixturedef._finalizers[:] = finalizers
+            if listener and container_uuid:
+                listener._cache._items[id(fixturedef)] = container_uuid
+
+    def _run_concurrently(self) -> None:
+        members = [member for member in self.members if member.setup_passed]
+        if not members:
+            return
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            loop = asyncio.get_event_loop()
+
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        root.handlers = [_TaskLogHandler(handlers)]
+        try:
+            loop.run_until_complete(asyncio.gather(*(self._run_one(member) for member in members)))
+        finally:
+            root.handlers = handlers
+        logger.debug(f"并发执行 {len(members)} 个测试，耗时 "
+                     f"{max(m.stop for m in members) - min(m.start for m in members):.3f}s")
+
+    @staticmethod
+    async def _run_one(member: _Member) -> None:
+        item = member.item
+        listener = item.config.pluginmanager.get_plugin("allure_listener")
+        current_executable.set(listener._cache.get(item.nodeid) if listener else None)
+        current_test.set(item.nodeid)
+        _log_buffer.set(member.logs)
+        member.request_log.activate()
+
+        func = getattr(item.obj, "_raw_test_func", item.obj)
+        kwargs = {arg: item.funcargs[arg] for arg in item._fixtureinfo.argnames}
+        member.start = time.time()
+        try:
+            await func(**kwargs)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except BaseException as e:
+            member.error = e
+        finally:
+            member.stop = time.time()
@@ -0,0 +1,158 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+
+from typing import Optional, Any, Callable, Dict, Iterator, List, Tuple
+
+from utils.template import TemplateContext, compile_template, render
+from utils.test_data_manage import TestData
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered not in ("true", "false"):
+        raise ValueError(f"invalid bool value: {value!r}")
+    return lowered == "true"
+
+
+# CSV 列可声明的类型
+_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": _parse_bool,
+    "json": json.loads,
+}
+
+
+class DataSource:
+    """
+    流式测试数据源，按行读取 JSONL/CSV 文件
+
+    收集阶段只用生成器扫描文件，记录每条用例的 id 和行偏移量；测试执行时才按偏移量读取该行并创建 TestData，
+    数十万行的数据文件不会整体加载到内存。CSV 第一行为表头，每条记录占一行，单元格默认保留为字符串
+    （负面输入语料中的 "NaN"、"1e5" 等原样发送），只有 types 声明的列才转换类型。
+    """
+
+    FORMATS = (".jsonl", ".csv")
+
+    def __init__(
+            self,
+            file_path: str | os.PathLike,
+            *,
+            id_field: Optional[str] = None,
+            start: int = 0,
+            stop: Optional[int] = None,
+            subset: Optional[float] = None,
+            seed: Any = 0,
+            types: Optional[Dict[str, str]] = None
+    ):
+        """
+        :param file_path: 数据文件路径
+        :param id_field: 作为用例 id 的字段，为空时使用 "文件名-行号"
+        :param start: 起始记录序号（包含）
+        :param stop: 结束记录序号（不包含），为空时读到文件末尾
+        :param subset: 按行内容哈希选取的记录比例，取值 (0, 1]
+        :param seed: 子集哈希种子，相同种子选取相同的子集
+        :param types: CSV 列的类型，如 {"expect_status_code": "int"}，可选 str/int/float/bool/json
+        """
+        self.file_path = os.fspath(file_path)
+        self.format = os.path.splitext(self.file_path)[1].lower()
+        if self.format not in self.FORMATS:
+            raise ValueError(f"Unsupported data source format. Allowed: {self.FORMATS}")
+        if subset is not None and not 0 < subset <= 1:
+            raise ValueError("subset must be in (0, 1]")
+
+        self.id_field = id_field
+        self.start = start
+        self.stop = stop
+        self.subset = subset
+        self.seed = str(seed)
+        self.fields: Optional[List[str]] = None
+        self.converters: Dict[str, Callable[[str], Any]] = {}
+        for field, type_name in (types or {}).items():
+            if type_name not in _CONVERTERS:
+                raise ValueError(f"Unsupported type {type_name!r} for field {field!r}. Allowed: {tuple(_CONVERTERS)}")
+            self.converters[field] = _CONVERTERS[type_name]
+        if self.format == ".csv":
+            with open(self.file_path, "r", encoding="utf-8-sig", newline="") as f:
+                self.fields = next(csv.reader([f.readline()]))
+            unknown = set(self.converters) - set(self.fields)
+            if unknown:
+                raise ValueError(f"types declares fields not in {self.file_path}: {sorted(unknown)}")
+
+    def iter_lines(self) -> Iterator[Tuple[int, int, bytes]]:
+        """逐行生成 (记录序号, 行偏移量, 行内容)，跳过空行和 CSV 表头"""
+        with open(self.file_path, "rb") as f:
+            if self.format == ".csv":
+                f.readline()
+            index = 0
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                yield index, offset, line
+                index += 1
+
+    def scan(self) -> Tuple[List[str], List[int]]:
+        """扫描数据文件，返回选中记录的 id 和行偏移量"""
+        ids = []
+        offsets = []
+        threshold = int(self.subset * 2 ** 64) if self.subset is not None else None
+        name = os.path.splitext(os.path.basename(self.file_path))[0]
+
+        for index, offset, line in self.iter_lines():
+            if index < self.start:
+                continue
+            if self.stop is not None and index >= self.stop:
+                break
+            if threshold is not None:
+                digest = hashlib.blake2b(line, digest_size=8, key=self.seed.encode()[:64]).digest()
+                if int.from_bytes(digest, "big") >= threshold:
+                    continue
+            if self.id_field:
+                ids.append(str(self._parse_line(line).get(self.id_field)))
+            else:
+                ids.append(f"{name}-{index}")
+            offsets.append(offset)
+
+        logger.debug(f"数据源 {self.file_path} 选中 {len(offsets)} 条记录")
+        return ids, offsets
+
+    def read(self, offset: int, context: TemplateContext) -> TestData:
+        """读取偏移量处的一条记录，渲染占位符后创建 TestData"""
+        with open(self.file_path, "rb") as f:
+            f.seek(offset)
+            row = self._parse_line(f.readline())
+        return TestData(**{k: render(compile_template(v), context) for k, v in row.items()})
+
+    def _parse_line(self, line: bytes) -> dict[str, Any]:
+        text = line.decode("utf-8")
+        if self.format == ".jsonl":
+            return json.loads(text)
+        row = dict(zip(self.fields, next(csv.reader([text]))))
+        for field, convert in self.converters.items():
+            row[field] = convert(row[field])
+        return row
+
+
+class SourceRow:
+    """
+    数据源中一条记录的引用，作为间接参数传给 test_data fixture
+    """
+
+    __slots__ = ("source", "offset")
+
+    def __init__(self, source: DataSource, offset: int):
+        self.source = source
+        self.offset = offset
+
+    def load(self, context: TemplateContext) -> TestData:
+        return self.source.read(self.offset, context)
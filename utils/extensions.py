@@ -1,9 +1,15 @@
+import hashlib
 import jsonschema
 import json
+import os
+import sys
+
+from contextlib import contextmanager
+from pathlib import Path
 
 from syrupy.types import SerializableData, SerializedData
 from syrupy.data import SnapshotCollection, Snapshot
-from utils.schema import generate_json_schema
+from utils.schema import FINGERPRINT_KEY, generate_fingerprinted_schema, structure_fingerprint
 from utils._utils import json_dumps
 
 from syrupy.terminal import (
@@ -29,17 +35,50 @@ from typing import (
 )
 
 from syrupy.constants import SYMBOL_ELLIPSIS
+from syrupy.extensions.base import AbstractSyrupyExtension
 from syrupy.extensions.single_file import (
     SingleFileSnapshotExtension,
     WriteMode,
 )
 
 if TYPE_CHECKING:
+    from syrupy.location import PyTestLocation
     from syrupy.types import (
         SerializableData,
         SerializedData,
+        SnapshotIndex,
     )
 
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+# 快照存储方式，由 --snapshot-store 选项设置：single 每个用例一个文件，packed 每个测试模块一个文件
+snapshot_store = "single"
+
+
+# 快照写入统计：written 为实际写入的快照数，unchanged 为内容未变化而跳过写入的快照数
+snapshot_write_stats = {"written": 0, "unchanged": 0}
+
+# 按快照内容哈希缓存编译后的校验器，同一进程内的所有测试和参数化用例共享
+_validator_cache: dict[str, jsonschema.protocols.Validator] = {}
+
+
+def get_validator(snapshot_data: str) -> jsonschema.protocols.Validator:
+    """
+    获取快照 schema 对应的校验器，schema 只解析和检查一次
+    :param snapshot_data: 快照文件中的 schema 字符串
+    """
+    key = hashlib.sha256(snapshot_data.encode()).hexdigest()
+    validator = _validator_cache.get(key)
+    if validator is None:
+        schema = json.loads(snapshot_data)
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        validator = _validator_cache[key] = validator_class(schema)
+    return validator
+
 
 class JSONSchemaSnapshotExtension(SingleFileSnapshotExtension):
     _write_mode = WriteMode.TEXT
@@ -48,11 +87,16 @@ class JSONSchemaSnapshotExtension(SingleFileSnapshotExtension):
     def __init__(self, **kwargs: Any):
         super().__init__(**kwargs)
         self.validation_error: Optional[jsonschema.ValidationError] = None
+        # 最近一次序列化的结果和原始对象，matches 时直接校验原始对象，避免再次反序列化
+        self._parsed: Optional[tuple[str, Any]] = None
 
     def serialize(self, data: "SerializableData", **kwargs: Any) -> "SerializedData":
         if isinstance(data, str):
             return data
-        return json_dumps(data)
+        # 序列化结果只用于生成 schema，不需要缩进和排序
+        serialized = json.dumps(data, ensure_ascii=False)
+        self._parsed = (serialized, data)
+        return serialized
 
     def matches(
             self,
@@ -62,15 +106,25 @@ class JSONSchemaSnapshotExtension(SingleFileSnapshotExtension):
             **kwargs: Any
     ) -> bool:
         try:
-            schema = json.loads(snapshot_data)
-            jsonschema.validate(instance=json.loads(serialized_data), schema=schema)
-            return True
-        except jsonschema.ValidationError as e:
-            self.validation_error = e
+            validator = get_validator(snapshot_data)
+            if self._parsed is not None and self._parsed[0] is serialized_data:
+                instance = self._parsed[1]
+            else:
+                instance = json.loads(serialized_data)
+            # 结构指纹一致时数据必然符合由同结构数据生成的 schema，跳过完整校验
+            fingerprint = validator.schema.get(FINGERPRINT_KEY) if isinstance(validator.schema, dict) else None
+            if fingerprint is not None and fingerprint == structure_fingerprint(instance):
+                return True
+            if validator.is_valid(instance):
+                return True
+            self.validation_error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
             return False
         except json.JSONDecodeError as e:
             self.validation_error = Exception(f"Invalid stored schema: {str(e)}")
             return False
+        except jsonschema.SchemaError as e:
+            self.validation_error = Exception(f"Invalid stored schema: {e.message}")
+            return False
 
     def diff_lines(
             self,
@@ -128,7 +182,161 @@ class JSONSchemaSnapshotExtension(SingleFileSnapshotExtension):
     ) -> None:
         snapshot = next(iter(snapshot_collection))
         if str(snapshot) is not None:
-            snapshot_collection.add(
-                Snapshot(name=snapshot.name, data=generate_json_schema(json.loads(snapshot.data))))
+            schema = generate_fingerprinted_schema(json.loads(snapshot.data))
+            if cls._is_unchanged(snapshot_collection.location, schema):
+                snapshot_write_stats["unchanged"] += 1
+                return
+            snapshot_collection.add(Snapshot(name=snapshot.name, data=schema))
 
         super()._write_snapshot_collection(snapshot_collection=snapshot_collection)
+        snapshot_write_stats["written"] += 1
+
+    @classmethod
+    def _is_unchanged(cls, location: str, schema: str) -> bool:
+        """磁盘上的快照与新生成的 schema 内容相同或语义相等"""
+        try:
+            with open(location, "r", encoding=cls.get_write_encoding()) as f:
+                stored = f.read()
+        except FileNotFoundError:
+            return False
+        if stored == schema:
+            return True
+        try:
+            return json.loads(stored) == json.loads(schema)
+        except json.JSONDecodeError:
+            return False
+
+
+@contextmanager
+def _exclusive_lock(location: str) -> Iterator[None]:
+    """
+    打包文件的进程间排他锁，锁在旁路的 <location>.lock 文件上，xdist 各 worker 的读取、合并和替换依次进行
+    """
+    Path(location).parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{location}.lock", "a+b") as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class PackedJSONSchemaSnapshotExtension(JSONSchemaSnapshotExtension):
+    """
+    打包存储的 schema 快照，每个测试模块一个 JSON 索引文件 __snapshots__/<module>.jsonpack
+
+    文件中 index 记录快照名到 schema 哈希的映射，schemas 按内容哈希去重存储，
+    每个进程只加载一次，写入时持有排他锁，合并磁盘上的最新内容后原子替换。
+    """
+
+    _file_extension = "jsonpack"
+
+    # 已加载的打包文件：location -> (快照名 -> schema 哈希, schema 哈希 -> schema 字符串)
+    _packs: dict[str, tuple[dict[str, str], dict[str, str]]] = {}
+
+    @classmethod
+    def get_snapshot_name(
+            cls, *, test_location: "PyTestLocation", index: "SnapshotIndex" = 0
+    ) -> str:
+        return AbstractSyrupyExtension.get_snapshot_name(test_location=test_location, index=index)
+
+    @classmethod
+    def dirname(cls, *, test_location: "PyTestLocation") -> str:
+        return AbstractSyrupyExtension.dirname(test_location=test_location)
+
+    @classmethod
+    def _get_file_basename(cls, *, test_location: "PyTestLocation", index: "SnapshotIndex") -> str:
+        return test_location.basename
+
+    @classmethod
+    def _load_pack(cls, location: str, reload: bool = False) -> tuple[dict[str, str], dict[str, str]]:
+        if reload or location not in cls._packs:
+            try:
+                with open(location, "r", encoding=cls.get_write_encoding()) as f:
+                    pack = json.load(f)
+                cls._packs[location] = (
+                    pack["index"],
+                    {digest: json_dumps(schema) for digest, schema in pack["schemas"].items()},
+                )
+            except FileNotFoundError:
+                cls._packs[location] = ({}, {})
+        return cls._packs[location]
+
+    @classmethod
+    def _dump_pack(cls, location: str, index: dict[str, str], schemas: dict[str, str]) -> None:
+        """原子写入打包文件，未被引用的 schema 会被清理"""
+        used = set(index.values())
+        pack = {
+            "index": dict(sorted(index.items())),
+            "schemas": {digest: json.loads(schemas[digest]) for digest in sorted(used)},
+        }
+        Path(location).parent.mkdir(parents=True, exist_ok=True)
+        tmp_location = f"{location}.{os.getpid()}.tmp"
+        with open(tmp_location, "w", encoding=cls.get_write_encoding()) as f:
+            f.write(json_dumps(pack))
+        os.replace(tmp_location, location)
+        cls._packs[location] = (index, {digest: schemas[digest] for digest in used})
+
+    def _read_snapshot_collection(self, *, snapshot_location: str) -> "SnapshotCollection":
+        index, _ = self._load_pack(snapshot_location)
+        snapshot_collection = SnapshotCollection(location=snapshot_location)
+        for name in index:
+            snapshot_collection.add(Snapshot(name=name))
+        return snapshot_collection
+
+    def _read_snapshot_data_from_location(
+            self, *, snapshot_location: str, snapshot_name: str, session_id: str
+    ) -> Optional["SerializableData"]:
+        index, schemas = self._load_pack(snapshot_location)
+        digest = index.get(snapshot_name)
+        return schemas.get(digest) if digest else None
+
+    def delete_snapshots(self, *, snapshot_location: str, snapshot_names: set[str]) -> None:
+        with _exclusive_lock(snapshot_location):
+            index, schemas = self._load_pack(snapshot_location, reload=True)
+            index = {name: digest for name, digest in index.items() if name not in snapshot_names}
+            if index:
+                self._dump_pack(snapshot_location, index, schemas)
+            else:
+                Path(snapshot_location).unlink(missing_ok=True)
+                self._packs.pop(snapshot_location, None)
+
+    @classmethod
+    def _write_snapshot_collection(cls, *, snapshot_collection: "SnapshotCollection") -> None:
+        with _exclusive_lock(snapshot_collection.location):
+            cls._merge_snapshot_collection(snapshot_collection)
+
+    @classmethod
+    def _merge_snapshot_collection(cls, snapshot_collection: "SnapshotCollection") -> None:
+        location = snapshot_collection.location
+        # 重新读取磁盘内容，合并其他 xdist worker 已写入的快照
+        index, schemas = cls._load_pack(location, reload=True)
+        index, schemas = dict(index), dict(schemas)
+
+        changed = 0
+        for snapshot in snapshot_collection:
+            schema = generate_fingerprinted_schema(json.loads(snapshot.data))
+            digest = hashlib.sha256(schema.encode()).hexdigest()[:16]
+            if index.get(snapshot.name) == digest:
+                snapshot_write_stats["unchanged"] += 1
+                continue
+            index[snapshot.name] = digest
+            schemas[digest] = schema
+            changed += 1
+
+        if changed:
+            cls._dump_pack(location, index, schemas)
+            snapshot_write_stats["written"] += changed
+
+
+def schema_extension() -> type[JSONSchemaSnapshotExtension]:
+    """根据 --snapshot-store 选项返回 schema 快照扩展"""
+    return PackedJSONSchemaSnapshotExtension if snapshot_store == "packed" else JSONSchemaSnapshotExtension
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+import httpx
+import pytest
+
+from core.latency import latency_recorder, summarize
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 场景函数：接收虚拟用户编号和迭代序号，抛出异常即视为本次迭代失败
+Scenario = Callable[[int, int], Awaitable[Any]]
+
+
+class IterationError(AssertionError):
+    """
+    场景中的业务失败，按响应状态码分类
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def error_type(error: BaseException) -> str:
+    """
+    错误分类：异常类型加状态码，消息中的虚拟用户、迭代序号等每次不同的内容不参与分类
+    """
+    # RestClient 的网络异常通过 pytest.fail 抛出，原始的 httpx 异常在 __context__ 中
+    if isinstance(error, pytest.fail.Exception) and error.__context__ is not None:
+        return f"{type(error).__name__}: {type(error.__context__).__name__}"
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and isinstance(getattr(error, "response", None), httpx.Response):
+        status_code = error.response.status_code
+    return f"{type(error).__name__} [{status_code}]" if status_code is not None else type(error).__name__
+
+
+class RateLimiter:
+    """
+    全局速率限制器，按固定间隔发放迭代许可
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = time.perf_counter()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.perf_counter()
+            wait = self._next - now
+            self._next = max(self._next, now) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class LoadRunner:
+    """
+    压测执行器，使用 N 个虚拟用户在事件循环内并发执行场景函数
+
+    虚拟用户在 ramp_up 秒内均匀启动，持续 duration 秒；
+    设置 rps 后所有虚拟用户共享一个速率限制器，concurrency 限制同时执行的迭代数。
+    """
+
+    def __init__(
+            self,
+            scenario: Scenario,
+            *,
+            users: int,
+            duration: float,
+            ramp_up: float = 0,
+            rps: Optional[float] = None,
+            concurrency: Optional[int] = None
+    ):
+        """
+        :param scenario: 场景函数
+        :param users: 虚拟用户数
+        :param duration: 压测持续时间（秒），包含 ramp_up
+        :param ramp_up: 虚拟用户全部启动所需时间（秒）
+        :param rps: 目标每秒迭代数，为空时不限速
+        :param concurrency: 同时执行的最大迭代数，默认等于虚拟用户数
+        """
+        self.scenario = scenario
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.rps = rps
+        self.concurrency = concurrency or users
+
+        self._durations: list[float] = []
+        self._errors: dict[str, int] = {}
+        # 每类错误的第一条消息
+        self._error_examples: dict[str, str] = {}
+
+    async def run(self) -> dict[str, Any]:
+        """执行压测并返回报告"""
+        limiter = RateLimiter(self.rps) if self.rps else None
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        deadline = start + self.duration
+
+        async def virtual_user(vu: int) -> None:
+            if self.users > 1 and self.ramp_up > 0:
+                await asyncio.sleep(self.ramp_up * vu / self.users)
+            iteration = 0
+            while time.perf_counter() < deadline:
+                if limiter:
+                    await limiter.acquire()
+                    if time.perf_counter() >= deadline:
+                        break
+                async with semaphore:
+                    await self._run_iteration(vu, iteration)
+                iteration += 1
+
+        await asyncio.gather(*(virtual_user(vu) for vu in range(self.users)))
+        return self.report(time.perf_counter() - start)
+
+    async def _run_iteration(self, vu: int, iteration: int) -> None:
+        begin = time.perf_counter()
+        try:
+            await self.scenario(vu, iteration)
+        # RestClient 的网络异常通过 pytest.fail 抛出，其异常类型不继承 Exception
+        except (Exception, pytest.fail.Exception) as e:
+            error = error_type(e)
+            self._errors[error] = self._errors.get(error, 0) + 1
+            self._error_examples.setdefault(error, str(e))
+            logger.debug(f"虚拟用户 {vu} 第 {iteration} 次迭代失败: {error}: {e}")
+        self._durations.append(time.perf_counter() - begin)
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        """生成包含吞吐量、错误率和耗时分位数的报告"""
+        iterations = len(self._durations)
+        errors = sum(self._errors.values())
+        requests = sum(len(series["total"]) for series in latency_recorder.samples.values())
+        return {
+            "users": self.users,
+            "elapsed": round(elapsed, 3),
+            "iterations": iterations,
+            "errors": errors,
+            "error_rate": round(errors / iterations, 4) if iterations else 0.0,
+            "throughput": round(iterations / elapsed, 3) if elapsed else 0.0,
+            "requests": requests,
+            "request_rate": round(requests / elapsed, 3) if elapsed else 0.0,
+            "iteration_latency": summarize(self._durations),
+            "endpoints": latency_recorder.report(),
+            "error_types": dict(sorted(self._errors.items(), key=lambda item: -item[1])),
+            "error_examples": self._error_examples,
+        }
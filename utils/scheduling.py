@@ -0,0 +1,217 @@
+import hashlib
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional, Dict, List, Iterable, Tuple
+
+from xdist.scheduler import LoadScopeScheduling
+
+logger = logging.getLogger(__name__)
+
+# 没有历史记录时的预估耗时（秒）
+DEFAULT_DURATION = 1.0
+
+
+def split_scope(nodeid: str) -> str:
+    """测试所属的调度分组：类中的测试按类分组，模块级测试按模块分组，与 xdist loadscope 一致"""
+    return nodeid.rsplit("::", 1)[0]
+
+
+class DurationHistory:
+    """
+    测试耗时历史库（sqlite）
+
+    按 nodeid 记录 setup、call、teardown 的总耗时，多次运行取指数加权平均，避免单次波动影响调度。
+    """
+
+    # 新样本在加权平均中的权重
+    ALPHA = 0.5
+
+    def __init__(self, db_path: str | os.PathLike):
+        self.db_path = Path(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS durations ("
+            "nodeid TEXT PRIMARY KEY, duration REAL NOT NULL, runs INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        return conn
+
+    def load(self) -> Dict[str, float]:
+        """读取全部测试的历史耗时"""
+        if not self.db_path.exists():
+            return {}
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT nodeid, duration FROM durations"))
+        finally:
+            conn.close()
+
+    def record(self, durations: Dict[str, float]) -> None:
+        """在一个事务中写入本次运行的耗时"""
+        if not durations:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO durations (nodeid, duration, runs, updated) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(nodeid) DO UPDATE SET "
+                    "duration = ? * excluded.duration + (1 - ?) * duration, runs = runs + 1, updated = excluded.updated",
+                    [(nodeid, duration, now, self.ALPHA, self.ALPHA) for nodeid, duration in durations.items()],
+                )
+        finally:
+            conn.close()
+        logger.debug(f"写入 {len(durations)} 条测试耗时到 {self.db_path}")
+
+    def export(self, file_path: str | os.PathLike) -> int:
+        """导出耗时快照（JSON：nodeid -> 秒），供 --shard 在各机器上使用同一份历史，返回导出的测试数"""
+        durations = self.load()
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(json.dumps(dict(sorted(durations.items())), indent=2, ensure_ascii=False) + "\n",
+                             encoding="utf-8")
+        return len(durations)
+
+
+def load_snapshot(file_path: str | os.PathLike) -> Dict[str, float]:
+    """读取 DurationHistory.export 导出的耗时快照，文件不存在时返回空字典"""
+    file_path = Path(file_path)
+    if not file_path.is_file():
+        return {}
+    return json.loads(file_path.read_text(encoding="utf-8"))
+
+
+def predict_durations(nodeids: Iterable[str], history: Dict[str, float]) -> Dict[str, float]:
+    """
+    按分组汇总预估耗时，没有历史记录的测试使用已知测试的平均耗时
+    """
+    default = sum(history.values()) / len(history) if history else DEFAULT_DURATION
+    scopes: Dict[str, float] = defaultdict(float)
+    for nodeid in nodeids:
+        scopes[split_scope(nodeid)] += history.get(nodeid, default)
+    return dict(scopes)
+
+
+def lpt_partition(scopes: Dict[str, float], bins: int) -> Tuple[List[List[str]], List[float]]:
+    """
+    最长处理时间优先（LPT）划分：分组按预估耗时降序依次放入当前负载最小的桶
+
+    相同输入总是得到相同结果：耗时相同的分组按名称排序，负载相同的桶取编号最小的。
+    :return: 每个桶的分组列表和预估负载
+    """
+    buckets: List[List[str]] = [[] for _ in range(bins)]
+    loads = [0.0] * bins
+    heap = [(0.0, i) for i in range(bins)]
+    for scope, duration in sorted(scopes.items(), key=lambda item: (-item[1], item[0])):
+        load, i = heapq.heappop(heap)
+        buckets[i].append(scope)
+        loads[i] = load + duration
+        heapq.heappush(heap, (loads[i], i))
+    return buckets, loads
+
+
+def hash_partition(scopes: Iterable[str], bins: int) -> List[List[str]]:
+    """按分组名的哈希划分，与机器、进程和 PYTHONHASHSEED 无关"""
+    buckets: List[List[str]] = [[] for _ in range(bins)]
+    for scope in sorted(scopes):
+        digest = hashlib.blake2b(scope.encode(), digest_size=8).digest()
+        buckets[int.from_bytes(digest, "big") % bins].append(scope)
+    return buckets
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """解析 i/n 格式的分片参数，i 从 1 开始"""
+    try:
+        index, total = map(int, value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}, expected i/n")
+    if not 1 <= index <= total:
+        raise ValueError(f"Invalid shard {value!r}, index must be between 1 and {total}")
+    return index, total
+
+
+def select_shard(nodeids: List[str], history: Dict[str, float], index: int, total: int) -> set[str]:
+    """
+    按历史耗时把测试分组 LPT 划分为 total 个分片，返回第 index 个分片包含的分组
+
+    同一份历史记录和测试集合总是得到相同的划分，因此各分片必须使用同一份耗时快照（见 load_snapshot）；
+    没有历史记录时按分组名的哈希划分。
+    """
+    if not history:
+        buckets = hash_partition({split_scope(nodeid) for nodeid in nodeids}, total)
+        logger.info(f"分片 {index}/{total}: 没有耗时快照，按哈希划分 {len(buckets[index - 1])} 个分组")
+        return set(buckets[index - 1])
+
+    buckets, loads = lpt_partition(predict_durations(nodeids, history), total)
+    logger.info(f"分片 {index}/{total}: {len(buckets[index - 1])} 个分组，预估耗时 {loads[index - 1]:.2f}s，"
+                f"各分片预估耗时 {[round(load, 2) for load in loads]}")
+    return set(buckets[index - 1])
+
+
+class ScheduleStats:
+    """
+    LPT 调度的预估与实际 makespan（从开始分发到最后一个 worker 完成的时间）
+    """
+
+    def __init__(self):
+        self.predicted: Optional[float] = None
+        self.actual: Dict[str, float] = defaultdict(float)
+        self.workers = 0
+        self.scopes = 0
+        self.unknown = 0
+
+    @property
+    def actual_makespan(self) -> float:
+        return max(self.actual.values(), default=0.0)
+
+
+schedule_stats = ScheduleStats()
+
+
+class LPTScheduling(LoadScopeScheduling):
+    """
+    基于历史耗时的 xdist 调度器
+
+    沿用 loadscope 的分组方式，同一个类（如 class 作用域事件循环的 TestUserVariable）始终在同一个 worker 执行；
+    工作队列按分组的预估耗时降序排列，空闲 worker 总是先领取最长的分组，即在线 LPT 调度。
+    """
+
+    def __init__(self, config, log=None, history: Optional[Dict[str, float]] = None):
+        super().__init__(config, log)
+        self.history = history or {}
+        self._sorted = False
+        self._start = 0.0
+
+    def _assign_work_unit(self, node) -> None:
+        if not self._sorted:
+            self._sort_workqueue()
+        super()._assign_work_unit(node)
+
+    def _sort_workqueue(self) -> None:
+        self._sorted = True
+        self._start = time.perf_counter()
+        scopes = predict_durations(self.collection, self.history)
+        ordered = sorted(self.workqueue.items(), key=lambda item: (-scopes[item[0]], item[0]))
+        self.workqueue.clear()
+        self.workqueue.update(ordered)
+
+        _, loads = lpt_partition(scopes, len(self.nodes))
+        schedule_stats.predicted = max(loads, default=0.0)
+        schedule_stats.workers = len(self.nodes)
+        schedule_stats.scopes = len(scopes)
+        schedule_stats.unknown = sum(1 for nodeid in self.collection if nodeid not in self.history)
+
+    def mark_test_complete(self, node, item_index: int, duration: float = 0) -> None:
+        # 记录 worker 完成最后一个测试的时间，最大值即实际 makespan
+        schedule_stats.actual[node.gateway.id] = time.perf_counter() - self._start
+        super().mark_test_complete(node, item_index, duration)
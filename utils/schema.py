@@ -1,7 +1,19 @@
+import hashlib
 import genson
 import utils
 from typing import Any
 
+# 快照 schema 中保存结构指纹的字段，jsonschema 校验时会忽略未知字段
+FINGERPRINT_KEY = "x-fingerprint"
+
+_TYPE_NAMES = {
+    bool: "boolean",
+    int: "integer",
+    float: "number",
+    str: "string",
+    type(None): "null",
+}
+
 
 def generate_json_schema(json_data: Any) -> str:
     """
@@ -20,3 +32,40 @@ def generate_schema_from_data(json_data: Any) -> dict:
     builder = genson.SchemaBuilder(schema_uri=False)
     builder.add_object(json_data)
     return builder.to_schema()
+
+
+def structure_fingerprint(json_data: Any) -> str:
+    """
+    计算 JSON 数据的结构指纹：所有键路径及其值类型的哈希，与具体值无关。
+
+    对象节点额外记录自身的键集合，数组元素统一记录在 "[]" 路径下，
+    因此指纹相同的数据一定能通过由同指纹数据生成的 genson schema 校验。
+
+    :param json_data: 输入的 JSON 数据。
+    :return: 16 位十六进制指纹。
+    """
+    nodes = set()
+    stack = [("$", json_data)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            nodes.add(f"{path}:object:{','.join(sorted(value))}")
+            stack.extend((f"{path}.{key}", item) for key, item in value.items())
+        elif isinstance(value, list):
+            nodes.add(f"{path}:array")
+            stack.extend((f"{path}[]", item) for item in value)
+        else:
+            nodes.add(f"{path}:{_TYPE_NAMES.get(type(value), type(value).__name__)}")
+    return hashlib.sha256("\n".join(sorted(nodes)).encode()).hexdigest()[:16]
+
+
+def generate_fingerprinted_schema(json_data: Any) -> str:
+    """
+    生成带结构指纹的 JSON Schema 字符串，用于写入快照。
+
+    :param json_data: 输入的 JSON 数据。
+    :return: 生成的 JSON Schema 字符串。
+    """
+    schema = generate_schema_from_data(json_data)
+    schema[FINGERPRINT_KEY] = structure_fingerprint(json_data)
+    return utils.json_dumps(schema)
@@ -1,33 +1,217 @@
 import inspect
+import time
+from contextvars import ContextVar
 from functools import wraps
-from threading import Lock
-from typing import Any, Callable, TypeVar, Dict
+from typing import Any, Callable, TypeVar, Dict, Optional, List, Tuple
 
 import allure_commons
 from allure_commons._core import plugin_manager
-from allure_commons.utils import uuid4, func_parameters, represent
+from allure_commons.model2 import ExecutableItem, Parameter, TestStepResult
+from allure_commons.reporter import AllureReporter
+from allure_commons.utils import uuid4, func_parameters, represent, now
+from allure_pytest.utils import get_status, get_status_details
+
+from utils.step_profiler import step_profiler, frame_name
 
 _TFunc = TypeVar("_TFunc", bound=Callable[..., Any])
 
+# 当前上下文（asyncio 任务）中正在执行的 allure 测试 uuid，
+# 同一事件循环中并发执行多个测试时，步骤和附件据此归属到正确的测试
+current_executable: ContextVar[Optional[str]] = ContextVar("allure_current_executable", default=None)
+
+# 当前上下文中正在执行的步骤，嵌套的步骤据此确定父步骤
+_current_step: ContextVar[Optional["_StepRecord"]] = ContextVar("allure_current_step", default=None)
+
+_last_executable = AllureReporter._last_executable
+
+
+def _context_last_executable(self: AllureReporter) -> Optional[str]:
+    step = _current_step.get()
+    if step is not None:
+        # 步骤只在内存中记录，有附件时才临时登记到 reporter，供其添加附件
+        if step.reporter is None:
+            step.reporter = self
+            self._items[step.uuid] = step
+        return step.uuid
+    uuid = current_executable.get()
+    if uuid is not None and self._items.get(uuid) is not None:
+        return uuid
+    return _last_executable(self)
+
+
+class _StepRecord:
+    """
+    内存中的步骤记录，标题和参数在 flush_steps 时才格式化
+    """
+
+    __slots__ = ("uuid", "title", "params", "func", "args", "kwargs", "start", "stop", "exc_info",
+                 "steps", "attachments", "reporter", "stack", "perf_start", "child_time")
+
+    def __init__(self, title: str, params: Dict[str, Any], func: Optional[Callable[..., Any]],
+                 args: tuple, kwargs: Dict[str, Any]):
+        self.uuid = uuid4()
+        self.title = title
+        self.params = params
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.start = now()
+        self.stop: Optional[int] = None
+        self.exc_info: Tuple[Any, Any, Any] = (None, None, None)
+        self.steps: List["_StepRecord"] = []
+        self.attachments: list = []
+        self.reporter: Optional[AllureReporter] = None
+        # 耗时统计用的调用栈和计时，见 utils.step_profiler
+        self.stack = ""
+        self.perf_start = 0.0
+        self.child_time = 0.0
+
+    def format(self) -> Tuple[str, Dict[str, Any]]:
+        """计算步骤的标题和参数，只在写入结果时调用"""
+        if self.func is None:
+            return self.title, self.params
+        params = func_parameters(self.func, *self.args, **self.kwargs)
+        return self.title.format(*map(represent, self.args), **params), params
+
+    def to_result(self) -> TestStepResult:
+        """转换为 allure 步骤结果"""
+        title, params = self.format()
+        exc_type, exc_val, exc_tb = self.exc_info
+        return TestStepResult(
+            name=title,
+            start=self.start,
+            stop=self.stop,
+            parameters=[Parameter(name=name, value=value) for name, value in params.items()],
+            status=get_status(exc_val),
+            statusDetails=get_status_details(exc_type, exc_val, exc_tb),
+            steps=[step.to_result() for step in self.steps],
+            attachments=self.attachments,
+        )
+
+
+# 已结束、等待写入所属测试或 fixture 结果的顶层步骤：(所属结果的 uuid, 所属结果, 步骤)
+_finished_steps: List[Tuple[str, ExecutableItem, _StepRecord]] = []
+
+
+def current_reporter() -> Optional[AllureReporter]:
+    """allure-pytest 注册的 reporter，未启用 allure 时为 None"""
+    for plugin in plugin_manager.get_plugins():
+        reporter = getattr(plugin, "allure_logger", None)
+        if isinstance(reporter, AllureReporter):
+            return reporter
+    return None
+
+
+def _replay(reporter: AllureReporter, parent_uuid: str, record: _StepRecord) -> None:
+    """
+    通过 allure 插件钩子回放一个步骤及其子步骤
+
+    start_step 钩子没有父级参数，回放期间以 current_executable 指定父级；钩子按当前时间创建步骤，回放后还原实际的起止时间和附件
+    """
+    title, params = record.format()
+    token = current_executable.set(parent_uuid)
+    try:
+        plugin_manager.hook.start_step(uuid=record.uuid, title=title, params=params)
+        step = reporter.get_item(record.uuid)
+        for child in record.steps:
+            _replay(reporter, record.uuid, child)
+        exc_type, exc_val, exc_tb = record.exc_info
+        plugin_manager.hook.stop_step(uuid=record.uuid, exc_type=exc_type, exc_val=exc_val, exc_tb=exc_tb)
+    finally:
+        current_executable.reset(token)
+    if step is not None:
+        step.start = record.start
+        step.stop = record.stop
+        step.attachments[:0] = record.attachments
+
+
+def flush_steps() -> None:
+    """
+    将缓冲的步骤通过 allure 插件钩子（start_step/stop_step）写入所属的测试或 fixture 结果
+
+    需在所属结果结束前调用，见 conftest 中的 pytest_fixture_setup、pytest_runtest_logfinish 和本模块的 stop_fixture 钩子；
+    所属结果已结束时（如 fixture 在 allure 包装之外注册的 finalizer 中的步骤）无法经过钩子，直接写入结果
+    """
+    global _finished_steps
+    finished, _finished_steps = _finished_steps, []
+    reporter = current_reporter()
+    step_token = _current_step.set(None)
+    try:
+        for parent_uuid, parent, record in finished:
+            if reporter is not None and reporter.get_item(parent_uuid) is parent:
+                _replay(reporter, parent_uuid, record)
+            else:
+                parent.steps.append(record.to_result())
+    finally:
+        _current_step.reset(step_token)
+
+
+class _StepFlusher:
+    """在 allure 结束 fixture 的 finalizer（after fixture）前写入其中的步骤"""
+
+    @allure_commons.hookimpl(tryfirst=True)
+    def stop_fixture(self, parent_uuid, uuid, name, exc_type, exc_val, exc_tb):
+        flush_steps()
+
+
+plugin_manager.register(_StepFlusher())
+
 
 class StepContext:
-    _lock = Lock()
+    """
+    allure 步骤，替换 allure_commons 的 StepContext
 
-    def __init__(self, title: str, params: Dict[str, Any]):
+    步骤栈按上下文（asyncio 任务）记录在 contextvar 中，执行时只在内存中记录，不调用 allure 插件钩子，
+    由 flush_steps 在所属的测试或 fixture 结束前统一通过 start_step/stop_step 钩子回放，其他 allure 监听器同样能收到步骤。
+    步骤中添加的附件仍需临时登记到 reporter（见 _context_last_executable）。未启用 allure 和步骤耗时统计时不记录。
+    """
+
+    def __init__(self, title: str, params: Dict[str, Any], func: Optional[Callable[..., Any]] = None,
+                 args: tuple = (), kwargs: Optional[Dict[str, Any]] = None):
         self.title = title
         self.params = params
-        self.uuid = uuid4()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.record: Optional[_StepRecord] = None
 
     def __enter__(self):
-        with self._lock:
-            plugin_manager.hook.start_step(
-                uuid=self.uuid, title=self.title, params=self.params)
+        parent = _current_step.get()
+        self._parent_item = None
+        if parent is None:
+            reporter = current_reporter()
+            if reporter is not None:
+                self._parent_uuid = _context_last_executable(reporter)
+                self._parent_item = reporter.get_item(self._parent_uuid)
+            if self._parent_item is None and not step_profiler.enabled:
+                return self
+        record = self.record = _StepRecord(self.title, self.params, self.func, self.args, self.kwargs)
+        if parent is not None:
+            parent.steps.append(record)
+        if step_profiler.enabled:
+            record.stack = f"{parent.stack};{frame_name(self.title)}" if parent else frame_name(self.title)
+            record.perf_start = time.perf_counter()
+        self._token = _current_step.set(record)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        with self._lock:
-            plugin_manager.hook.stop_step(
-                uuid=self.uuid, title=self.title, exc_type=exc_type, exc_val=exc_val, exc_tb=exc_tb)
+        record = self.record
+        if record is None:
+            return
+        _current_step.reset(self._token)
+        record.stop = now()
+        if step_profiler.enabled:
+            wall = time.perf_counter() - record.perf_start
+            parent = _current_step.get()
+            if parent is not None:
+                parent.child_time += wall
+            step_profiler.add(record.stack, self.title, wall, max(wall - record.child_time, 0.0))
+        record.exc_info = (exc_type, exc_val, exc_tb)
+        if record.reporter is not None:
+            record.reporter._items.pop(record.uuid)
+            record.reporter = None
+        if self._parent_item is not None:
+            _finished_steps.append((self._parent_uuid, self._parent_item, record))
 
     async def __aenter__(self):
         self.__enter__()  # 直接调用同步 __enter__
@@ -37,11 +221,8 @@ class StepContext:
         self.__exit__(exc_type, exc_val, exc_tb)
 
     def _create_context(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> 'StepContext':
-        """Helper method to create context and format title."""
-        params = func_parameters(func, *args, **kwargs)
-        formatted_args = list(map(represent, args))
-        title = self.title.format(*formatted_args, **params)
-        return StepContext(title, params)
+        """Helper method to create context, title is formatted lazily."""
+        return StepContext(self.title, self.params, func, args, kwargs)
 
     def __call__(self, func: _TFunc) -> _TFunc:
         if inspect.iscoroutinefunction(func):
@@ -61,3 +242,4 @@ class StepContext:
 
 
 allure_commons._allure.StepContext = StepContext
+AllureReporter._last_executable = _context_last_executable
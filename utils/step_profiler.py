@@ -0,0 +1,66 @@
+import os
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+def frame_name(title: str) -> str:
+    """步骤标题作为调用栈帧名，去掉 collapsed 格式中的分隔符"""
+    return title.replace(";", ",").replace("\n", " ")
+
+
+class StepProfiler:
+    """
+    按步骤标题模板（格式化前的标题，如 "获取用户信息 {username}"）聚合步骤耗时（秒）
+
+    - wall: 步骤开始到结束的时间，包含子步骤
+    - self: 扣除子步骤后的时间；asyncio 任务中并发执行的子步骤耗时可能超过父步骤，此时按 0 计
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        # collapsed 调用栈（"父步骤;子步骤"）到 self 耗时
+        self.stacks: Dict[str, float] = defaultdict(float)
+
+    def add(self, stack: str, title: str, wall: float, self_time: float) -> None:
+        stat = self.stats[title]
+        stat[0] += 1
+        stat[1] += wall
+        stat[2] += self_time
+        self.stacks[stack] += self_time
+
+    def merge(self, exported: Dict[str, Any]) -> None:
+        """合并其他进程（xdist worker）的统计"""
+        for title, (count, wall, self_time) in exported.get("stats", {}).items():
+            stat = self.stats[title]
+            stat[0] += count
+            stat[1] += wall
+            stat[2] += self_time
+        for stack, self_time in exported.get("stacks", {}).items():
+            self.stacks[stack] += self_time
+
+    def export(self) -> Dict[str, Any]:
+        """导出可跨进程传输的统计"""
+        return {"stats": dict(self.stats), "stacks": dict(self.stacks)}
+
+    def top(self, n: int) -> List[Tuple[str, int, float, float]]:
+        """按 self 耗时降序的前 n 个步骤：(标题模板, 次数, wall, self)"""
+        ordered = sorted(self.stats.items(), key=lambda item: (-item[1][2], item[0]))
+        return [(title, count, wall, self_time) for title, (count, wall, self_time) in ordered[:n]]
+
+    def write_collapsed(self, file_path: str | os.PathLike) -> None:
+        """
+        写入 collapsed 调用栈文件（每行 "栈;帧 值"，值为 self 耗时微秒），可直接用 flamegraph.pl、speedscope 等工具打开
+        """
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            for stack in sorted(self.stacks):
+                microseconds = round(self.stacks[stack] * 1_000_000)
+                if microseconds > 0:
+                    f.write(f"{stack} {microseconds}\n")
+
+
+step_profiler = StepProfiler()
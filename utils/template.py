@@ -0,0 +1,89 @@
+import itertools
+import os
+import random
+import re
+import uuid
+
+from typing import Any, Optional
+
+# 支持的占位符，其余花括号内容按普通文本处理
+PLACEHOLDER = re.compile(r"\{(timestamp|uuid|worker|seq|random)\}")
+
+_GENERATORS = {
+    "timestamp": lambda ctx: ctx.timestamp,
+    "uuid": lambda ctx: uuid.uuid4().hex,
+    "worker": lambda ctx: ctx.worker,
+    "seq": lambda ctx: next(ctx.seq),
+    "random": lambda ctx: ctx.random.randrange(10 ** 9),
+}
+
+
+class TemplateContext:
+    """
+    占位符取值上下文，每个进程一个
+
+    - timestamp: 本次运行的时间戳，xdist 下所有 worker 相同
+    - uuid: 每次取值生成新的 uuid4（十六进制）
+    - worker: xdist worker id（如 gw0），未使用 xdist 时为 master
+    - seq: 进程内自增序号，各 worker 独立计数，只有与 {worker} 组合使用才能保证唯一
+    - random: 由种子和 worker id 确定的伪随机整数，相同种子和相同的 worker 分配可复现
+
+    会出现在请求路径、请求头或请求体中的值只应使用 {timestamp}：回放磁带时使用录制时的时间戳，渲染结果与录制时相同，
+    其余占位符随 worker 分配或每次取值变化，无法从磁带回放（见 core.cassette）
+    """
+
+    def __init__(self, timestamp: int, seed: Any = None):
+        self.timestamp = timestamp
+        self.worker = os.environ.get("PYTEST_XDIST_WORKER", "master")
+        self.seq = itertools.count(1)
+        self.random = random.Random(f"{timestamp if seed is None else seed}-{self.worker}")
+
+
+class Template:
+    """
+    编译后的单元格模板，parts 为文本和占位符名交替排列的元组，首尾均为文本
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: tuple[str, ...]):
+        self.parts = parts
+
+    def render(self, context: TemplateContext) -> str:
+        parts = self.parts
+        rendered = [parts[0]]
+        for i in range(1, len(parts), 2):
+            rendered.append(str(_GENERATORS[parts[i]](context)))
+            rendered.append(parts[i + 1])
+        return "".join(rendered)
+
+    def __repr__(self):
+        return f"Template({self.parts!r})"
+
+
+def compile_template(value: Any) -> Any:
+    """
+    编译单元格的值，不包含占位符的值原样返回，渲染时无需再处理
+    """
+    if type(value) != str or "{" not in value:
+        return value
+    parts = PLACEHOLDER.split(value)
+    if len(parts) == 1:
+        return value
+    return Template(tuple(parts))
+
+
+def render(value: Any, context: Optional[TemplateContext]) -> Any:
+    """渲染编译后的值"""
+    if type(value) is Template:
+        return value.render(context)
+    return value
+
+
+def render_stable(value: Any, timestamp: int) -> Any:
+    """
+    只替换 {timestamp}，用于收集阶段的用例 id，保证各 xdist worker 收集到的 id 一致
+    """
+    if type(value) != str:
+        return value
+    return value.replace("{timestamp}", str(timestamp))
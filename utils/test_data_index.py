@@ -0,0 +1,166 @@
+import logging
+import os
+import pickle
+
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from utils._utils import timestamp
+from utils.data_source import DataSource, SourceRow
+from utils.template import TemplateContext, Template, compile_template, render, render_stable
+from utils.test_data_manage import TestData, test_data
+
+logger = logging.getLogger(__name__)
+
+
+class ParamTable:
+    """
+    单个测试函数的参数化数据：字段名、用例 id 和每行编译后的字段值
+    """
+
+    indirect = False
+
+    def __init__(self, fields: Tuple[str, ...], ids: List[str], rows: List[Tuple[Any, ...]]):
+        self.fields = fields
+        self.ids = ids
+        self.rows = [tuple(map(compile_template, row)) for row in rows]
+        # 没有任何占位符的表格创建 TestData 时跳过渲染
+        self.templated = any(type(value) is Template for row in self.rows for value in row)
+
+    def parameters(self, context: TemplateContext) -> List[TestData]:
+        """为每行数据创建新的 TestData 对象，避免不同测试函数共享可变对象，同一表头的所有行共享一个记录类"""
+        record_type = TestData.record_type(self.fields)
+        if not self.templated:
+            return [record_type(**dict(zip(self.fields, row))) for row in self.rows]
+        return [record_type(**{field: render(value, context) for field, value in zip(self.fields, row)})
+                for row in self.rows]
+
+
+class SourceTable:
+    """
+    流式数据源的参数化数据：用例 id 和行偏移量，TestData 在测试执行时由 test_data fixture 创建
+    """
+
+    indirect = True
+
+    def __init__(self, source: DataSource, ids: List[str], offsets: List[int]):
+        self.source = source
+        self.ids = ids
+        self.offsets = offsets
+
+    def parameters(self, context: TemplateContext) -> List[SourceRow]:
+        return [SourceRow(self.source, offset) for offset in self.offsets]
+
+
+class TestDataIndex:
+    """
+    收集阶段的测试数据索引
+
+    一次性加载目录下所有 test_data.yaml，预先按测试函数名展开表格数据并编译占位符模板，
+    pytest_generate_tests 直接取用，占位符在各进程创建 TestData 时渲染（见 utils.template）。包含 data_source 键的测试数据指向 JSONL/CSV 文件，只索引选中记录的偏移量。
+    xdist 下由主进程构建后保存到文件，各 worker 加载同一份索引，保证所有 worker 收集到的参数和 id 一致。
+    """
+
+    __test__ = False
+
+    FILE_NAME = "test_data.yaml"
+
+    def __init__(self):
+        self.timestamp: Optional[int] = None
+        self.seed: Any = None
+        self.tables: Dict[Tuple[str, str], ParamTable | SourceTable] = {}
+        self._indexed_dirs: set[str] = set()
+        self._context: Optional[TemplateContext] = None
+
+    @property
+    def context(self) -> TemplateContext:
+        """本进程的占位符取值上下文"""
+        if self._context is None:
+            self._context = TemplateContext(self.timestamp, self.seed)
+        return self._context
+
+    @property
+    def built(self) -> bool:
+        return self.timestamp is not None
+
+    def build(self, root: str | os.PathLike, ts: Optional[int] = None, seed: Any = None) -> None:
+        """
+        索引 root 下所有测试数据文件
+
+        :param root: 测试用例根目录
+        :param ts: 替换 {timestamp} 占位符的时间戳，默认取当前时间
+        :param seed: 数据源子集的哈希种子，默认使用时间戳，即每次运行选取不同的子集
+        """
+        self.timestamp = timestamp() if ts is None else ts
+        self.seed = self.timestamp if seed is None else seed
+        for data_file in sorted(Path(root).rglob(self.FILE_NAME)):
+            self._index_dir(str(data_file.parent))
+        logger.debug(f"测试数据索引构建完成，共 {len(self.tables)} 个测试函数")
+
+    def get(self, directory: str | os.PathLike, test_name: str) -> Optional[ParamTable | SourceTable]:
+        """获取测试函数的参数化数据，未索引的目录按需加载"""
+        if not self.built:
+            self.timestamp = self.seed = timestamp()
+        directory = os.fspath(directory)
+        if directory not in self._indexed_dirs:
+            self._index_dir(directory)
+        return self.tables.get((directory, test_name))
+
+    def save(self, file_path: str | os.PathLike) -> None:
+        """保存索引，供 xdist worker 加载"""
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, "wb") as f:
+            pickle.dump((self.timestamp, self.seed, self.tables, self._indexed_dirs), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, file_path: str | os.PathLike) -> None:
+        """加载主进程保存的索引"""
+        with open(file_path, "rb") as f:
+            self.timestamp, self.seed, self.tables, self._indexed_dirs = pickle.load(f)
+        self._context = None
+
+    def _index_dir(self, directory: str) -> None:
+        self._indexed_dirs.add(directory)
+        data_file = os.path.join(directory, self.FILE_NAME)
+        if not os.path.exists(data_file):
+            return
+        for test_name, data in (test_data.get_data(data_file) or {}).items():
+            table = self._expand(directory, data)
+            if table is not None:
+                self.tables[(directory, test_name)] = table
+
+    def _expand(self, directory: str, data: Any) -> Optional[ParamTable | SourceTable]:
+        """
+        展开单个测试函数的数据
+
+        字典格式为单条用例，包含 data_source 键时为流式数据源；列表格式第一行为表头（首列为用例 id），其余为数据行。
+        用例 id 在收集阶段确定，只替换 {timestamp}，保证各 worker 收集到的 id 一致
+        """
+        if type(data) == dict and "data_source" in data:
+            start, stop = data.get("range") or (0, None)
+            source = DataSource(
+                os.path.join(directory, data["data_source"]),
+                id_field=data.get("id_field"),
+                start=start,
+                stop=stop,
+                subset=data.get("subset"),
+                seed=self.seed,
+                types=data.get("types"),
+            )
+            ids, offsets = source.scan()
+            return SourceTable(source, ids, offsets)
+        elif type(data) == dict:
+            return ParamTable(tuple(data.keys()), [render_stable(data.get("case_name", "test"), self.timestamp)],
+                              [tuple(data.values())])
+        elif type(data) == list and len(data) >= 2:
+            field_names = tuple(data[0][1:])
+            ids = []
+            rows = []
+            for value in data[1:]:
+                ids.append(render_stable(value[0], self.timestamp))
+                rows.append(tuple(value[1:]))
+            return ParamTable(field_names, ids, rows)
+        return None
+
+
+test_data_index = TestDataIndex()
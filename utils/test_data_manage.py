@@ -1,14 +1,24 @@
+import hashlib
+import keyword
 import logging
+import os
+import pickle
 import pytest
 import yaml
 import json
 
-from multiprocessing import Manager
+from pathlib import Path
 from configparser import ConfigParser
 from typing import Optional, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# 优先使用 libyaml 的 C 加载器
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# 编译后的测试数据缓存目录
+_CACHE_DIR = Path(__file__).parent.parent / ".pytest_cache" / "test_data"
+
 
 class MyConfigParser(ConfigParser):
     """重写 configparser 中的 optionxform 函数，解决 .ini 文件中的键option自动转为小写的问题"""
@@ -32,7 +42,7 @@ def _load_file(file_path, loader, file_type):
 
 def load_yaml(file_path):
     """加载 YAML 文件"""
-    return _load_file(file_path, yaml.safe_load, "YAML")
+    return _load_file(file_path, lambda f: yaml.load(f, Loader=_YamlLoader), "YAML")
 
 
 def load_json(file_path):
@@ -59,24 +69,58 @@ def load_ini(file_path):
 class DataCache:
     """
     带有缓存的文件读取类
+
+    每个进程内存缓存一份解析结果；YAML 解析结果同时以 pickle 格式编译到磁盘，
+    以文件路径、修改时间和大小作为键，xdist 各 worker 直接加载编译结果而无需重复解析。
     """
 
-    def __init__(self):
-        self.manager = Manager()  # 创建一个多进程共享对象
-        self.cache = self.manager.dict()  # 创建一个进程安全的共享字典
+    def __init__(self, cache_dir: Path = _CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.cache: Dict[str, Any] = {}
 
     def get_data(self, data_file_path) -> Dict[str, Any]:
         try:
-            if data_file_path in self.cache:
+            key = os.fspath(data_file_path)
+            if key in self.cache:
                 logger.debug(f"加载缓存数据 {data_file_path}")
-                return self.cache[data_file_path]
+                return self.cache[key]
             else:
-                yaml_data = load_yaml(data_file_path)
-                self.cache[data_file_path] = yaml_data
+                yaml_data = self._load_compiled(key)
+                self.cache[key] = yaml_data
                 return yaml_data
         except Exception as e:
             pytest.skip(f"测试数据加载错误: {str(e)}")
 
+    def _load_compiled(self, file_path: str) -> Any:
+        """加载编译后的测试数据，源文件变化或缓存不可用时重新解析 YAML"""
+        stat = os.stat(file_path)
+        path_hash = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()[:16]
+        version_hash = hashlib.sha256(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:16]
+        compiled_file = self.cache_dir / f"{path_hash}-{version_hash}.pickle"
+
+        try:
+            with open(compiled_file, "rb") as f:
+                logger.debug(f"加载编译数据 {compiled_file}")
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        data = load_yaml(file_path)
+        if data is not None:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_file = compiled_file.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_file, "wb") as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, compiled_file)
+                # 清理同一源文件的旧版本
+                for stale_file in self.cache_dir.glob(f"{path_hash}-*.pickle"):
+                    if stale_file != compiled_file:
+                        stale_file.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"写入编译数据失败: {compiled_file}，错误信息: {e}")
+        return data
+
     def _get_loader(self, suffix: str) -> callable:
         return {
             ".yaml": load_yaml,
@@ -88,38 +132,98 @@ class DataCache:
 
 
 class TestData:
+    """
+    测试数据记录
+
+    TestData(**kwargs) 按字段名生成带 __slots__ 的记录类，相同表头的所有行共享同一个类，实例不持有 __dict__。
+    所有字段都可以作为属性访问，不以 expect_ 开头的字段同时支持 test_data["key"] 和 keys() 的字典式访问。
+    """
+
     __test__ = False
+    __slots__ = ("expect_success", "expect_status_code", "_extra")
+
+    # 记录类的字段（不含 expect_ 开头的字段）和全部属性名
+    _keys: tuple[str, ...] = ()
+    _attrs: tuple[str, ...] = ("expect_success", "expect_status_code")
+    _record_types: Dict[tuple[str, ...], type] = {}
+
+    def __new__(cls, **kwargs):
+        if cls is TestData:
+            cls = cls.record_type(tuple(kwargs))
+        return super().__new__(cls)
 
     def __init__(self, **kwargs):
         self.expect_success: Optional[bool] = None
         self.expect_status_code: Optional[int] = None
+        self._extra: Optional[Dict[str, Any]] = None
 
-        # 过滤掉以 expect_ 开头的键后存入 _dict
-        self._dict = {k: v for k, v in kwargs.items() if not k.startswith("expect_")}
-
-        # 设置所有传入的键为实例属性（包括 expect_ 开头的）
         for key, value in kwargs.items():
+            self._set(key, value)
+
+    @classmethod
+    def record_type(cls, fields: tuple[str, ...]) -> type:
+        """获取字段名对应的记录类，相同字段名共享同一个类"""
+        record_type = cls._record_types.get(fields)
+        if record_type is None:
+            # 无法作为属性名或与方法同名的字段存入 _extra
+            slots = tuple(f for f in dict.fromkeys(fields)
+                          if f.isidentifier() and not keyword.iskeyword(f) and not hasattr(TestData, f))
+            record_type = type("TestData", (TestData,), {
+                "__slots__": slots,
+                "__module__": __name__,
+                "_keys": tuple(f for f in dict.fromkeys(fields) if not f.startswith("expect_")),
+                "_attrs": TestData._attrs + slots,
+            })
+            cls._record_types[fields] = record_type
+        return record_type
+
+    def _set(self, key: str, value: Any):
+        try:
             setattr(self, key, value)
+        except AttributeError:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __getattr__(self, name):
+        # 仅在常规属性查找失败时调用：未赋值的 slot 或存入 _extra 的字段
+        if name != "_extra" and self._extra is not None and name in self._extra:
+            return self._extra[name]
+        raise AttributeError(name)
 
     def __getitem__(self, key):
-        return self._dict[key]
+        if key.startswith("expect_") or key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key) if key not in (self._extra or {}) else self._extra[key]
 
     def keys(self):
-        return self._dict.keys()
+        if not self._extra:
+            return self._keys
+        return self._keys + tuple(k for k in self._extra if not k.startswith("expect_") and k not in self._keys)
 
     def update(self, data: dict[str, Any]):
-        # 更新时自动过滤以 expect_ 开头的键
-        filtered_data = {k: v for k, v in data.items() if not k.startswith("expect_")}
-        self._dict.update(filtered_data)
-
-        # 设置所有传入的键为实例属性（包括 expect_ 开头的）
         for key, value in data.items():
-            setattr(self, key, value)
+            self._set(key, value)
+
+    def _items(self):
+        for key in self._attrs:
+            if hasattr(self, key):
+                yield key, getattr(self, key)
+        if self._extra:
+            yield from self._extra.items()
+
+    def __reduce__(self):
+        return _restore_test_data, (dict(self._items()),)
 
     def __str__(self):
-        return f"TestData({', '.join(f'{k}={v}' for k, v in self.__dict__.items() if k != "_dict")})"
+        return f"TestData({', '.join(f'{k}={v}' for k, v in self._items())})"
 
     def __repr__(self):
         return self.__str__()
 
+
+def _restore_test_data(data: Dict[str, Any]) -> TestData:
+    return TestData(**data)
+
+
 test_data = DataCache()